@@ -0,0 +1,60 @@
+"""poi mirror
+
+Revision ID: 3f9c1d2a7b84
+Revises: 65bd418ef387
+Create Date: 2026-10-18 12:10:04.512331
+
+"""
+from typing import Sequence, Union
+from sqlalchemy.dialects import postgresql
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c1d2a7b84'
+down_revision: Union[str, Sequence[str], None] = '65bd418ef387'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The old poi table was never written to, recreate it as the mirror
+    op.execute('DROP TABLE IF EXISTS poi')
+    op.create_table('poi',
+        sa.Column('id', postgresql.UUID(), nullable=False),
+        sa.Column('poi_url', sa.String(), nullable=False),
+        sa.Column('site_id', sa.String(), nullable=False),
+        sa.Column('ivion_poi_id', sa.String(), nullable=False),
+        sa.Column('data', postgresql.JSONB(), nullable=True),
+        sa.Column('data_hash', sa.String(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('synced_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('site_id', 'ivion_poi_id', name='uq_poi_site_ivion_poi')
+    )
+    op.create_index(op.f('ix_poi_site_id'), 'poi', ['site_id'], unique=False)
+    # create_all at startup may have created it before this ran. It only
+    # records sync progress, the next sync of each site rebuilds it
+    op.execute('DROP TABLE IF EXISTS poi_sync_state')
+    op.create_table('poi_sync_state',
+        sa.Column('site_id', sa.String(), nullable=False),
+        sa.Column('synced_at', sa.DateTime(), nullable=False),
+        sa.Column('watermark', sa.DateTime(), nullable=True),
+        sa.Column('poi_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('site_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('poi_sync_state')
+    op.drop_index(op.f('ix_poi_site_id'), table_name='poi')
+    op.drop_table('poi')
+    op.create_table('poi',
+        sa.Column('id', postgresql.UUID(), nullable=False),
+        sa.Column('poi_url', sa.String(), nullable=False),
+        sa.Column('site_id', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
@@ -0,0 +1,91 @@
+"""partition session
+
+Revision ID: 8a41e6c0d2f5
+Revises: 3f9c1d2a7b84
+Create Date: 2026-10-18 14:32:51.204117
+
+"""
+from datetime import date, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy.dialects import postgresql
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a41e6c0d2f5'
+down_revision: Union[str, Sequence[str], None] = '3f9c1d2a7b84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partitions created up front, the retention job keeps creating new ones
+DAYS_AHEAD = 7
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Range partition session by created_at with one partition per day.
+    # The partition key has to be part of the primary key.
+    op.execute('ALTER TABLE session RENAME TO session_old')
+    op.execute('ALTER TABLE session_old RENAME CONSTRAINT session_pkey TO session_old_pkey')
+    op.execute('''
+        CREATE TABLE session (
+            id UUID NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            expering_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            user_id UUID NOT NULL REFERENCES "user" (id),
+            site_id UUID NOT NULL REFERENCES site (id),
+            data JSONB,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    ''')
+    op.execute('CREATE TABLE session_default PARTITION OF session DEFAULT')
+
+    today = date.today()
+    for offset in range(DAYS_AHEAD + 1):
+        day = today + timedelta(days=offset)
+        op.execute(
+            f"CREATE TABLE session_p{day:%Y%m%d} PARTITION OF session "
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+        )
+
+    # Composite index for valid-session lookups, created on every partition
+    op.create_index(
+        'ix_session_user_site_expering',
+        'session',
+        ['user_id', 'site_id', 'expering_at'],
+        unique=False,
+    )
+
+    # Sessions older than today are long expired, only today's are kept
+    op.execute(f'''
+        INSERT INTO session (id, created_at, expering_at, user_id, site_id, data)
+        SELECT id, created_at, expering_at, user_id, site_id, data
+        FROM session_old
+        WHERE created_at >= '{today.isoformat()}'
+    ''')
+    op.execute('DROP TABLE session_old')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('ALTER TABLE session RENAME TO session_partitioned')
+    op.create_table('session',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('expering_at', sa.DateTime(), nullable=False),
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('site_id', sa.UUID(), nullable=False),
+        sa.Column('data', postgresql.JSONB(), nullable=True),
+        sa.ForeignKeyConstraint(['site_id'], ['site.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id', name='session_pkey_new')
+    )
+    op.execute('''
+        INSERT INTO session (id, created_at, expering_at, user_id, site_id, data)
+        SELECT id, created_at, expering_at, user_id, site_id, data
+        FROM session_partitioned
+    ''')
+    op.execute('DROP TABLE session_partitioned CASCADE')
+    op.execute('ALTER TABLE session RENAME CONSTRAINT session_pkey_new TO session_pkey')
@@ -138,10 +138,13 @@
 
 
 from typing import Annotated
-from app.database.database import get_session
-from fastapi import BackgroundTasks, Depends, HTTPException, status, FastAPI, Security
+from app.database.database import get_read_session, get_session
+from fastapi import BackgroundTasks, Depends, HTTPException, status, FastAPI, Request, Security
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.http import IvionHttpClients
+from app.services.bulk_import import BulkImportService
 from app.services.openpack import OpenpackService
+from app.services.poi import PoiService
 from app.services.site import SiteService
 from app.services.user import UserService
 from fastapi.security import APIKeyHeader
@@ -158,15 +161,23 @@ ADMIN_TOKEN = security_settings.ADMIN_TOKEN
 OPENPACK_TOKEN = security_settings.OPENPACK_TOKEN
 
 SessionDep = Annotated[AsyncSession, Depends(get_session)]
+# Replica session when one is configured and not lagging, else the same as SessionDep
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
+
+# Shared IVION http clients created in the app lifespan
+def get_http_clients(request: Request) -> IvionHttpClients:
+    return request.app.state.http_clients
+
+HttpClientsDep = Annotated[IvionHttpClients, Depends(get_http_clients)]
 
 def get_User_service(session: SessionDep):
     return UserService(session)
 
-def get_Site_service(session: SessionDep):
-    return SiteService(session)
+def get_Site_service(session: SessionDep, read_session: ReadSessionDep, http_clients: HttpClientsDep):
+    return SiteService(session, http_clients, read_session=read_session)
 
-def get_Openpack_service(session: SessionDep):
-    return OpenpackService(session)
+def get_Openpack_service(session: SessionDep, read_session: ReadSessionDep, http_clients: HttpClientsDep):
+    return OpenpackService(session, http_clients, read_session=read_session)
 
 # User service dep annotation
 UserServiceDep = Annotated[
@@ -182,13 +193,27 @@ SiteServiceDep = Annotated[
     Depends(get_Site_service),
 ]
 
+def get_Poi_service(session: SessionDep, openpack: OpenpackServiceDep):
+    return PoiService(session, openpack)
+
+PoiServiceDep = Annotated[
+    PoiService,
+    Depends(get_Poi_service),
+]
+
+def get_BulkImport_service(session: SessionDep):
+    return BulkImportService(session)
+
+BulkImportServiceDep = Annotated[
+    BulkImportService,
+    Depends(get_BulkImport_service),
+]
+
 app = FastAPI()
 
 api_key_header = APIKeyHeader(name="Authorization", auto_error=False)
 
 async def verify_token(api_key: str = Security(api_key_header)):
-    print("reached ",api_key)
-    print("required ",OPENPACK_TOKEN)
     if not api_key:
         raise HTTPException(status_code=403, detail="Authorization header missing")
     
@@ -1,7 +1,8 @@
 from fastapi import APIRouter
-from .routers import user, openpack
+from .routers import admin, user, openpack
 
 master_router = APIRouter()
 
 master_router.include_router(user.router)
-master_router.include_router(openpack.router)
\ No newline at end of file
+master_router.include_router(openpack.router)
+master_router.include_router(admin.router)
\ No newline at end of file
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends
+
+from app.core.circuit_breaker import circuit_breakers
+from app.core.credential_cache import credential_cache
+from app.core.invalidation import invalidation_listener
+from app.core.response_cache import response_cache
+from app.core.retry import upstream_retry
+from app.database.database import pool_stats, replica_engine, replica_monitor
+from app.database.redis import shared_cache
+from app.utils import crypto_pool
+
+from ..dependencies import verify_admin
+
+router = APIRouter(prefix="/admin", tags=["ALL"])
+
+
+### Runtime statistics of the shared pools and caches
+@router.get("/stats")
+async def get_stats(token: str = Depends(verify_admin)):
+    return {
+        "db_pool": pool_stats(),
+        "db_replica_pool": pool_stats(replica_engine) if replica_engine is not None else None,
+        "db_replica": replica_monitor.stats(),
+        "crypto_pool": crypto_pool.stats(),
+        "response_cache": response_cache.stats(),
+        "credential_cache": credential_cache.stats(),
+        "invalidation_listener": invalidation_listener.stats(),
+        "redis": shared_cache.stats(),
+        "circuit_breakers": circuit_breakers.stats(),
+        "upstream_retry": upstream_retry.stats(),
+    }
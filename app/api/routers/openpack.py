@@ -1,7 +1,9 @@
-from typing import Annotated
+from datetime import datetime
+from typing import Annotated, Literal
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Form, Request
+from fastapi import APIRouter, Depends, Form, Query, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.templating import Jinja2Templates
 from pydantic import EmailStr
@@ -10,8 +12,8 @@ from app.database.models import User
 from app.utils import TEMPLATE_DIR
 from app.config import app_settings
 
-from ..dependencies import OpenpackServiceDep, SiteServiceDep, UserServiceDep, verify_admin, verify_token_openpack
-from ..schemas.user import GetToken, SessionRead, SignedUrl, SiteCreate, SiteRead, SiteUser, SitesRead, UserCreate, UserRead
+from ..dependencies import OpenpackServiceDep, PoiServiceDep, SiteServiceDep, UserServiceDep, verify_admin, verify_token_openpack
+from ..schemas.user import BatchRequest, GetToken, PoiQuery, PoiSyncRead, SessionRead, SignedUrl, SiteCreate, SiteRead, SiteUser, SitesRead, UserCreate, UserRead
 
 router = APIRouter(prefix="/openpack", tags=["Openpack"])
 
@@ -27,9 +29,33 @@ async def get_token(request: Request, service: OpenpackServiceDep, token: str =
 async def get_SiteInfo(request: Request, siteId: str, service: OpenpackServiceDep, token: str = Depends(verify_token_openpack)):
     return await service.get_SiteInfo(siteId)
 
+def get_poi_query(
+    limit: Annotated[int | None, Query(ge=1, le=1000)] = None,
+    cursor: str | None = None,
+    poi_type: Annotated[list[str], Query()] = [],
+    poi_type_group: Annotated[list[str], Query()] = [],
+    modified_since: datetime | None = None,
+    fields: Annotated[str | None, Query(description="Comma separated POI fields to return")] = None,
+) -> PoiQuery:
+    return PoiQuery(
+        limit=limit,
+        cursor=cursor,
+        poi_type=poi_type,
+        poi_type_group=poi_type_group,
+        modified_since=modified_since,
+        fields=[field.strip() for field in fields.split(",") if field.strip()] if fields else [],
+    )
+
 @router.get("/sitePois/")
-async def get_SitePois(request: Request, siteId: str, service: OpenpackServiceDep, token: str = Depends(verify_token_openpack)):
-    return await service.get_SitePois(siteId)
+async def get_SitePois(request: Request, siteId: str, service: OpenpackServiceDep, poi_service: PoiServiceDep, query: Annotated[PoiQuery, Depends(get_poi_query)], stream: bool | None = None, source: Literal["upstream", "local"] = "upstream", token: str = Depends(verify_token_openpack)):
+    if source == "local":
+        return await poi_service.get_SitePois(siteId, query=query)
+    return await service.get_SitePois(siteId, stream=stream, query=query)
+
+@router.post("/sitePois/sync", response_model=PoiSyncRead)
+async def sync_SitePois(request: Request, siteId: str, poi_service: PoiServiceDep, allowEmpty: bool = False, token: str = Depends(verify_token_openpack)):
+    # allowEmpty confirms that a site without POIs upstream really is empty
+    return await poi_service.sync_site(siteId, allow_empty=allowEmpty)
 
 
 @router.get("/access", response_model=SignedUrl)
@@ -37,6 +63,11 @@ async def get_signedUrl(request: Request, siteId: str, service: OpenpackServiceD
     return await service.get_signedUrl(siteId)
 
 
+@router.post("/batch", response_class=ORJSONResponse)
+async def batch(request: Request, batch: BatchRequest, service: OpenpackServiceDep, token: str = Depends(verify_token_openpack)):
+    return ORJSONResponse(await service.batch(batch.operations))
+
+
 
 
 
@@ -9,8 +9,10 @@ from pydantic import EmailStr
 from app.utils import TEMPLATE_DIR
 from app.config import app_settings
 
-from ..dependencies import SiteServiceDep, UserServiceDep, verify_admin, verify_token
-from ..schemas.user import SiteCreate, SiteRead, SiteUser, UserCreate, UserRead
+from app.services.bulk_import import parse_rows
+
+from ..dependencies import BulkImportServiceDep, SiteServiceDep, UserServiceDep, verify_admin, verify_token
+from ..schemas.user import BulkImportRead, SiteCreate, SiteRead, SiteUser, UserCreate, UserRead
 
 router = APIRouter(prefix="/user", tags=["ALL"])
 
@@ -21,6 +23,19 @@ async def register_user(user: UserCreate, service: UserServiceDep, token: str =
     return await service.add(user)
 
 
+### Register many users at once from a JSON array or a CSV file
+@router.post("/bulk", response_model=BulkImportRead)
+async def register_users_bulk(request: Request, service: BulkImportServiceDep, token: str = Depends(verify_token)):
+    rows = parse_rows(await request.body(), request.headers.get("content-type"))
+    return await service.import_users(rows)
+
+
+@router.post("/site/bulk", response_model=BulkImportRead)
+async def create_sites_bulk(request: Request, service: BulkImportServiceDep, token: str = Depends(verify_admin)):
+    rows = parse_rows(await request.body(), request.headers.get("content-type"))
+    return await service.import_sites(rows)
+
+
 @router.post("/site", response_model=SiteRead)
 async def create_site(site: SiteCreate, service: SiteServiceDep, token: str = Depends(verify_admin)):
     return await service.add(site)
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Literal
 from uuid import UUID
 from pydantic import BaseModel, EmailStr
 
@@ -48,4 +49,42 @@ class GetToken(BaseModel):
     refresh_token: str
 
 class SignedUrl(BaseModel):
-    signedUrl: str
\ No newline at end of file
+    signedUrl: str
+
+class PoiSyncRead(BaseModel):
+    site_id: str
+    synced_at: datetime
+    watermark: datetime | None
+    poi_count: int
+
+class PoiQuery(BaseModel):
+    limit: int | None = None
+    cursor: str | None = None
+    poi_type: list[str] = []
+    poi_type_group: list[str] = []
+    modified_since: datetime | None = None
+    fields: list[str] = []
+
+    def is_empty(self) -> bool:
+        return not (
+            self.limit or self.cursor or self.poi_type or self.poi_type_group
+            or self.modified_since or self.fields
+        )
+
+class BatchOperation(BaseModel):
+    op: Literal["siteInfo", "sitePois", "access"]
+    siteId: str
+
+class BatchRequest(BaseModel):
+    operations: list[BatchOperation]
+
+class BulkRowResult(BaseModel):
+    row: int
+    id: UUID | None = None
+    error: str | None = None
+    missing_site_ids: list[UUID] = []
+
+class BulkImportRead(BaseModel):
+    created: int
+    failed: int
+    rows: list[BulkRowResult]
@@ -0,0 +1,51 @@
+"""
+Command line bulk import, same rules as POST /user/bulk and /user/site/bulk.
+
+    python -m app.cli users users.csv
+    python -m app.cli sites sites.json
+"""
+import argparse
+import asyncio
+from pathlib import Path
+
+import orjson
+
+from app.database.database import async_session_factory, engine
+from app.services.bulk_import import BulkImportService, parse_rows
+from app.utils import crypto_pool
+
+
+async def _import(kind: str, path: Path, fmt: str | None) -> dict:
+    fmt = fmt or ("csv" if path.suffix.lower() == ".csv" else "json")
+    rows = parse_rows(path.read_bytes(), "text/csv" if fmt == "csv" else "application/json")
+
+    async with async_session_factory() as session:
+        service = BulkImportService(session)
+        if kind == "users":
+            report = await service.import_users(rows)
+        else:
+            report = await service.import_sites(rows)
+
+    await engine.dispose()
+    crypto_pool.shutdown()
+    return report.model_dump(mode="json")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk import users or sites")
+    parser.add_argument("kind", choices=["users", "sites"])
+    parser.add_argument("file", type=Path, help="JSON array or CSV file with a header line")
+    parser.add_argument("--format", choices=["json", "csv"], help="Defaults to the file extension")
+    parser.add_argument("--errors-only", action="store_true", help="Only print the failed rows")
+    args = parser.parse_args()
+
+    report = asyncio.run(_import(args.kind, args.file, args.format))
+    if args.errors_only:
+        report["rows"] = [row for row in report["rows"] if row["error"]]
+    print(orjson.dumps(report, option=orjson.OPT_INDENT_2).decode())
+    if report["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
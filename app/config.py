@@ -12,6 +12,29 @@ class AppSettings(BaseSettings):
     APP_NAME: str = "FastShip"
     APP_DOMAIN: str = "localhost:8000"
 
+    # Structured logging
+    LOG_LEVEL: str = "INFO"
+    # Per-logger overrides, e.g. "app.services=DEBUG,sqlalchemy.engine=WARNING"
+    LOG_LEVELS: str = ""
+    LOG_MAX_FIELD_LENGTH: int = 2000
+    LOG_DEBUG_SAMPLE_RATE: float = 1.0
+    LOG_DEBUG_MAX_PER_SECOND: int = 100
+
+    # Prometheus /metrics endpoint
+    METRICS_ENABLED: bool = True
+
+    # Request tracing, exported as OTLP-style JSON lines
+    TRACING_ENABLED: bool = False
+    TRACING_SAMPLE_RATE: float = 0.1
+    # "stdout" or a file path
+    TRACING_EXPORT_TO: str = "stdout"
+    TRACING_SERVICE_NAME: str = "fback"
+
+    # /user/bulk and /user/site/bulk imports
+    BULK_IMPORT_MAX_ROWS: int = 10000
+    BULK_INSERT_BATCH_SIZE: int = 1000
+    model_config = _base_config
+
 
 class SecuritySettings(BaseSettings):
 
@@ -20,7 +43,150 @@ class SecuritySettings(BaseSettings):
     API_TOKEN: str
     ADMIN_TOKEN: str
     OPENPACK_TOKEN: str
+
+    # Pool for bcrypt and JWT signing, kept off the event loop
+    CRYPTO_MAX_WORKERS: int = 2
+    CRYPTO_MAX_QUEUE: int = 64
+    CRYPTO_USE_PROCESSES: bool = False
+    model_config = _base_config
+
+
+class IvionSettings(BaseSettings):
+    # IVION instance the openpack endpoints proxy, e.g. a local mock for benchmarks
+    IVION_INSTANCE_URL: str = "https://factory360core.iv.navvis.com"
+
+    # A cached session is treated as expired this many seconds early
+    TOKEN_EXPIRY_MARGIN_SECONDS: int = 60
+    REFRESH_TOKEN_PATH: str = "/api/auth/refresh_access_token"
+
+    # Background token refresher
+    TOKEN_REFRESH_ENABLED: bool = True
+    TOKEN_REFRESH_INTERVAL_SECONDS: float = 30.0
+    TOKEN_REFRESH_LEAD_SECONDS: int = 300
+    # Stop refreshing accounts that have not been used for this long
+    TOKEN_REFRESH_IDLE_SECONDS: int = 3600
+
+    # siteInfo/sitePois response cache
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    # Bounds on the serialized size of the cached values. Parsed values
+    # take a few times that in memory. A value over the per-entry bound,
+    # e.g. the POIs of a huge site, is not cached at all
+    RESPONSE_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    RESPONSE_CACHE_MAX_ENTRY_BYTES: int = 32 * 1024 * 1024
+    SITE_INFO_CACHE_TTL_SECONDS: float = 300.0
+    SITE_POIS_CACHE_TTL_SECONDS: float = 60.0
+    # How long past its TTL an entry may be served while it is refreshed
+    RESPONSE_CACHE_STALE_SECONDS: float = 600.0
+
+    # Forward upstream bodies untouched instead of the status/headers/json wrapper
+    RESPONSE_PASSTHROUGH: bool = False
+
+    # Stream /openpack/sitePois instead of buffering the upstream body
+    SITE_POIS_STREAMING: bool = False
+    STREAM_CHUNK_SIZE: int = 64 * 1024
+    STREAM_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # Local POI mirror
+    POI_SYNC_ENABLED: bool = True
+    POI_SYNC_INTERVAL_SECONDS: float = 900.0
+    POI_SYNC_BATCH_SIZE: int = 500
+
+    # Resolved user/site credentials kept in memory
+    CREDENTIAL_CACHE_TTL_SECONDS: float = 300.0
+    CREDENTIAL_CACHE_MAX_ENTRIES: int = 1024
+
+    # /openpack/batch
+    BATCH_MAX_OPERATIONS: int = 100
+    BATCH_CONCURRENCY: int = 8
+
+    # Shared HTTP client pool (one pool per instance_url)
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    HTTP_TIMEOUT_SECONDS: float = 10.0
+    HTTP2_ENABLED: bool = False
+
+    # Circuit breaker per instance_url, failing fast while IVION is down
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    CIRCUIT_WINDOW_SECONDS: float = 30.0
+    # Calls needed in the window before the rates are judged
+    CIRCUIT_MIN_CALLS: int = 20
+    CIRCUIT_FAILURE_RATE: float = 0.5
+    CIRCUIT_SLOW_CALL_SECONDS: float = 5.0
+    CIRCUIT_SLOW_CALL_RATE: float = 0.8
+    CIRCUIT_OPEN_SECONDS: float = 30.0
+    CIRCUIT_HALF_OPEN_PROBES: int = 3
+    # Cached responses up to this old are served while the circuit is open
+    CIRCUIT_STALE_MAX_AGE_SECONDS: float = 86400.0
+
+    # Retries of idempotent upstream GETs, attempts include the first call
+    UPSTREAM_RETRY_ATTEMPTS: int = 3
+    UPSTREAM_RETRY_BASE_DELAY_SECONDS: float = 0.1
+    UPSTREAM_RETRY_MAX_DELAY_SECONDS: float = 2.0
+    # JSON list in the environment, e.g. [502, 503, 504]
+    UPSTREAM_RETRY_STATUSES: set[int] = {502, 503, 504}
+    # Retries and hedges together stay under this share of the upstream calls
+    UPSTREAM_RETRY_BUDGET_RATIO: float = 0.1
+    UPSTREAM_RETRY_BUDGET_BURST: int = 10
+    # Second request once the first is slower than the observed quantile
+    UPSTREAM_HEDGING_ENABLED: bool = False
+    UPSTREAM_HEDGE_QUANTILE: float = 0.95
+    UPSTREAM_HEDGE_MIN_DELAY_SECONDS: float = 0.05
+    # Latencies observed before an operation is hedged
+    UPSTREAM_HEDGE_MIN_SAMPLES: int = 50
+    model_config = _base_config
+
+
+class DatabaseSettings(BaseSettings):
+    # Connection pool of the async engine
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # asyncpg prepared statement cache per connection
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # Behind pgbouncer in transaction mode server-side prepared statements
+    # can't be reused across transactions, so they are disabled
+    DB_PGBOUNCER_MODE: bool = False
+    DB_ECHO: bool = False
+
+    # Optional read replica, same database name and credentials as the primary
+    POSTGRES_REPLICA_HOST: str | None = None
+    POSTGRES_REPLICA_PORT: int | None = None
+    # Reads go back to the primary while the replica lags more than this
+    DB_REPLICA_MAX_LAG_SECONDS: float = 5.0
+    DB_REPLICA_LAG_CHECK_INTERVAL_SECONDS: float = 10.0
+    # A probe taking longer marks the replica unusable until the next one
+    DB_REPLICA_LAG_CHECK_TIMEOUT_SECONDS: float = 2.0
+
+    # LISTEN/NOTIFY bus evicting stale entries from every worker's caches
+    CACHE_INVALIDATION_ENABLED: bool = True
+    CACHE_INVALIDATION_CHANNEL: str = "fback_cache_invalidation"
+    CACHE_INVALIDATION_RECONNECT_SECONDS: float = 5.0
+
+    # Optional Redis shared by all workers for IVION tokens and responses
+    REDIS_URL: str | None = None
+    REDIS_KEY_PREFIX: str = "fback"
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = 1.0
+    # After a Redis error only the local caches are used for this long
+    REDIS_RETRY_SECONDS: float = 30.0
+    # Distributed IVION login lock
+    REDIS_LOCK_TIMEOUT_SECONDS: float = 30.0
+    REDIS_LOCK_WAIT_SECONDS: float = 15.0
+
+    # Session table partitions and retention
+    SESSION_PARTITION_DAYS_AHEAD: int = 7
+    SESSION_RETENTION_DAYS: int = 2
+    SESSION_RETENTION_ENABLED: bool = True
+    SESSION_RETENTION_INTERVAL_SECONDS: float = 3600.0
+    # Longest wait for the lock on session when a partition can't be
+    # detached concurrently, the partition is retried on the next run
+    SESSION_PARTITION_LOCK_TIMEOUT_MS: int = 2000
     model_config = _base_config
 
 app_settings = AppSettings()
-security_settings = SecuritySettings()
\ No newline at end of file
+security_settings = SecuritySettings()
+ivion_settings = IvionSettings()
+database_settings = DatabaseSettings()
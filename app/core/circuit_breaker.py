@@ -0,0 +1,201 @@
+import time
+from collections import deque
+
+import httpx
+from fastapi import HTTPException, status
+
+from app.config import ivion_settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class UpstreamUnavailable(HTTPException):
+    """Raised instead of calling an instance whose circuit is open"""
+
+    def __init__(self, instance_url: str, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"IVION instance {instance_url} is unavailable, retry later",
+            headers={"Retry-After": str(max(int(retry_after + 0.999), 1))},
+        )
+
+
+class CircuitBreaker:
+    """
+    Tracks the calls to one IVION instance in a rolling window of
+    one-second buckets. The circuit opens when enough of them fail or are
+    slow; while open every call is rejected right away. After
+    `open_seconds` a few probe calls are let through (half-open) and
+    their outcome closes or reopens the circuit.
+    """
+
+    def __init__(
+        self,
+        instance_url: str,
+        window_seconds: float,
+        min_calls: int,
+        failure_rate: float,
+        slow_call_seconds: float,
+        slow_call_rate: float,
+        open_seconds: float,
+        half_open_probes: int,
+    ):
+        self.instance_url = instance_url
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        # [second, calls, failures, slow calls]
+        self._buckets: deque[list[int]] = deque()
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def _retry_after(self) -> float:
+        return self._opened_at + self.open_seconds - time.monotonic()
+
+    def acquire(self) -> None:
+        """Admit one call, raising UpstreamUnavailable if the circuit is open"""
+        if self.state == OPEN:
+            if self._retry_after() > 0:
+                self.rejected += 1
+                raise UpstreamUnavailable(self.instance_url, self._retry_after())
+            self.state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight + self._probe_successes >= self.half_open_probes:
+                self.rejected += 1
+                raise UpstreamUnavailable(self.instance_url, 1)
+            self._probes_in_flight += 1
+
+    def release(self) -> None:
+        """An admitted call ended without an outcome, e.g. it was cancelled"""
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+
+    def record(self, success: bool, duration: float) -> None:
+        slow = duration >= self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+            if not success or slow:
+                self._open()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_probes:
+                self.state = CLOSED
+                self._buckets.clear()
+            return
+        if self.state == OPEN:
+            # Admitted before the circuit opened
+            return
+
+        now = int(time.monotonic())
+        if not self._buckets or self._buckets[-1][0] != now:
+            self._buckets.append([now, 0, 0, 0])
+        bucket = self._buckets[-1]
+        bucket[1] += 1
+        bucket[2] += not success
+        bucket[3] += slow
+        while self._buckets and self._buckets[0][0] <= now - self.window_seconds:
+            self._buckets.popleft()
+
+        calls = sum(bucket[1] for bucket in self._buckets)
+        if calls < self.min_calls:
+            return
+        failures = sum(bucket[2] for bucket in self._buckets)
+        slow_calls = sum(bucket[3] for bucket in self._buckets)
+        if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+            self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._buckets.clear()
+        self.opened += 1
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "calls": sum(bucket[1] for bucket in self._buckets),
+            "failures": sum(bucket[2] for bucket in self._buckets),
+            "slow_calls": sum(bucket[3] for bucket in self._buckets),
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class CircuitBreakers:
+    """One CircuitBreaker per instance_url, created on first use"""
+
+    def __init__(self, enabled: bool, **options):
+        self.enabled = enabled
+        self.options = options
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def get(self, instance_url: str) -> CircuitBreaker:
+        key = instance_url.rstrip("/")
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(key, **self.options)
+        return breaker
+
+    def is_open(self, instance_url: str) -> bool:
+        breaker = self._breakers.get(instance_url.rstrip("/"))
+        return breaker is not None and breaker.state == OPEN
+
+    def stats(self) -> dict:
+        return {url: breaker.stats() for url, breaker in self._breakers.items()}
+
+
+circuit_breakers = CircuitBreakers(
+    enabled=ivion_settings.CIRCUIT_BREAKER_ENABLED,
+    window_seconds=ivion_settings.CIRCUIT_WINDOW_SECONDS,
+    min_calls=ivion_settings.CIRCUIT_MIN_CALLS,
+    failure_rate=ivion_settings.CIRCUIT_FAILURE_RATE,
+    slow_call_seconds=ivion_settings.CIRCUIT_SLOW_CALL_SECONDS,
+    slow_call_rate=ivion_settings.CIRCUIT_SLOW_CALL_RATE,
+    open_seconds=ivion_settings.CIRCUIT_OPEN_SECONDS,
+    half_open_probes=ivion_settings.CIRCUIT_HALF_OPEN_PROBES,
+)
+
+
+class CircuitBreakerTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport wrapper feeding every call's outcome to the breaker.
+    Connection errors, timeouts and 5xx responses count as failures;
+    streamed calls are judged by their response headers.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, breaker: CircuitBreaker):
+        self.transport = transport
+        self.breaker = breaker
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.breaker.acquire()
+        start = time.perf_counter()
+        recorded = False
+        try:
+            response = await self.transport.handle_async_request(request)
+            self.breaker.record(response.status_code < 500, time.perf_counter() - start)
+            recorded = True
+            return response
+        except httpx.TransportError:
+            self.breaker.record(False, time.perf_counter() - start)
+            recorded = True
+            raise
+        finally:
+            if not recorded:
+                self.breaker.release()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
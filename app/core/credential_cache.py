@@ -0,0 +1,71 @@
+import time
+from collections import OrderedDict
+from typing import Hashable
+from uuid import UUID
+
+from app.api.schemas.user import SiteUser
+from app.config import ivion_settings
+
+
+class CredentialCache:
+    """
+    Process-level TTL cache of resolved `SiteUser` credentials, so hot
+    requests don't look up the user and its site link in Postgres.
+
+    Keys are chosen by the caller, entries are evicted by the user or site
+    they belong to whenever UserService/SiteService write those.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (stored_at, site_user)
+        self._entries: OrderedDict[Hashable, tuple[float, SiteUser]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> SiteUser | None:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, site_user: SiteUser) -> None:
+        self._entries[key] = (time.monotonic(), site_user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _evict(self, matches) -> None:
+        for key, (_, site_user) in list(self._entries.items()):
+            if matches(key, site_user):
+                del self._entries[key]
+
+    def invalidate_user(self, user_id: UUID | str | None = None, username: str | None = None) -> None:
+        self._evict(lambda key, site_user: (
+            (user_id is not None and str(site_user.user_id) == str(user_id))
+            or (username is not None and isinstance(key, tuple) and username in key)
+        ))
+
+    def invalidate_site(self, site_id: UUID | str) -> None:
+        self._evict(lambda key, site_user: str(site_user.site_id) == str(site_id))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+credential_cache = CredentialCache(
+    ttl=ivion_settings.CREDENTIAL_CACHE_TTL_SECONDS,
+    max_entries=ivion_settings.CREDENTIAL_CACHE_MAX_ENTRIES,
+)
@@ -0,0 +1,64 @@
+from importlib.util import find_spec
+
+import httpx
+
+from app.config import ivion_settings
+from app.core.circuit_breaker import CircuitBreakerTransport, circuit_breakers
+from app.core.tracing import TracingTransport
+
+
+class IvionHttpClients:
+    """
+    Process-wide pooled httpx clients, one per IVION instance_url, so
+    connections (and their TLS sessions) are reused across requests.
+
+    Created in the app lifespan and closed on shutdown.
+    """
+
+    def __init__(
+        self,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        timeout: float,
+        http2: bool = False,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout)
+        # HTTP/2 needs the optional `h2` package
+        self.http2 = http2 and find_spec("h2") is not None
+        self._clients: dict[str, httpx.AsyncClient] = {}
+
+    @classmethod
+    def from_settings(cls) -> "IvionHttpClients":
+        return cls(
+            max_connections=ivion_settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=ivion_settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=ivion_settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            timeout=ivion_settings.HTTP_TIMEOUT_SECONDS,
+            http2=ivion_settings.HTTP2_ENABLED,
+        )
+
+    def get(self, instance_url: str) -> httpx.AsyncClient:
+        key = instance_url.rstrip("/")
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            transport = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+            if circuit_breakers.enabled:
+                transport = CircuitBreakerTransport(transport, circuit_breakers.get(key))
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                transport=TracingTransport(transport),
+            )
+            self._clients[key] = client
+        return client
+
+    async def aclose(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from uuid import UUID, uuid4
+
+import asyncpg
+import orjson
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import database_settings
+from app.core.credential_cache import credential_cache
+from app.database.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Identifies this worker, so it skips the events it published itself
+_ORIGIN = uuid4().hex
+
+
+def apply_invalidation(event: dict) -> None:
+    """Evict what an event refers to from this worker's caches"""
+    kind = event.get("kind")
+    if kind == "user":
+        credential_cache.invalidate_user(event.get("id"), event.get("username"))
+    elif kind == "site":
+        credential_cache.invalidate_site(event["id"])
+    else:
+        # Bulk writes and unknown events
+        credential_cache.clear()
+
+
+async def publish_invalidation(
+    session: AsyncSession,
+    kind: str,
+    id: UUID | str | None = None,
+    username: str | None = None,
+) -> None:
+    """
+    Queue a NOTIFY in the session's transaction. Postgres only delivers it
+    once the transaction commits and drops it on rollback.
+    """
+    if not database_settings.CACHE_INVALIDATION_ENABLED:
+        return
+    payload = orjson.dumps({
+        "origin": _ORIGIN,
+        "kind": kind,
+        "id": str(id) if id is not None else None,
+        "username": username,
+    }).decode()
+    await session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": database_settings.CACHE_INVALIDATION_CHANNEL, "payload": payload},
+    )
+
+
+class InvalidationListener:
+    """
+    LISTENs for invalidation events on a dedicated asyncpg connection,
+    outside the SQLAlchemy pool. Events sent while the connection was down
+    are lost, so the caches are cleared after every reconnect.
+    """
+
+    def __init__(self, channel: str, reconnect_interval: float):
+        self.channel = channel
+        self.reconnect_interval = reconnect_interval
+        self.received = 0
+        self.reconnects = 0
+        self._conn: asyncpg.Connection | None = None
+        self._task: asyncio.Task | None = None
+
+    def _dsn(self) -> str:
+        return engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+    def _on_notify(self, conn, pid, channel, payload) -> None:
+        try:
+            event = orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            return
+        if event.get("origin") == _ORIGIN:
+            return
+        self.received += 1
+        apply_invalidation(event)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self._conn = await asyncpg.connect(self._dsn())
+                closed = asyncio.Event()
+                self._conn.add_termination_listener(lambda _: closed.set())
+                await self._conn.add_listener(self.channel, self._on_notify)
+                if self.reconnects:
+                    credential_cache.clear()
+                await closed.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Cache invalidation listener failed: %s", e)
+            self.reconnects += 1
+            await asyncio.sleep(self.reconnect_interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+
+    def stats(self) -> dict:
+        return {
+            "connected": self._conn is not None and not self._conn.is_closed(),
+            "received": self.received,
+            "reconnects": self.reconnects,
+        }
+
+
+invalidation_listener = InvalidationListener(
+    channel=database_settings.CACHE_INVALIDATION_CHANNEL,
+    reconnect_interval=database_settings.CACHE_INVALIDATION_RECONNECT_SECONDS,
+)
@@ -0,0 +1,144 @@
+import logging
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
+
+from app.config import app_settings
+from app.core.tracing import current_span
+
+# Library loggers too chatty at INFO: httpx logs every request it sends.
+# LOG_LEVELS still overrides these.
+_DEFAULT_LEVELS = {"httpx": "WARNING", "httpcore": "WARNING"}
+
+# Attributes every LogRecord has, anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "trace_id"}
+
+
+def _truncate(value, limit: int):
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}...(+{len(value) - limit} chars)"
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, long strings cut at `max_length`"""
+
+    def __init__(self, max_length: int):
+        super().__init__()
+        self.max_length = max_length
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": _truncate(record.getMessage(), self.max_length),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = _truncate(
+                    value if isinstance(value, (str, int, float, bool, type(None))) else str(value),
+                    self.max_length,
+                )
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry).decode()
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves the record unformatted, so the request path
+    pays for a queue put only. Formatting and I/O happen on the listener
+    thread. The trace id is captured here, the contextvar holding it is
+    not visible from that thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        span = current_span()
+        record.trace_id = span.trace_id if span is not None else None
+        return record
+
+
+class DebugSampler(logging.Filter):
+    """
+    Lets through a `rate` fraction of DEBUG records and at most
+    `max_per_second` of them, higher levels always pass.
+    """
+
+    def __init__(self, rate: float, max_per_second: int):
+        super().__init__()
+        self.rate = rate
+        self.max_per_second = max_per_second
+        self._window = 0
+        self._count = 0
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        if self.rate < 1.0 and random.random() >= self.rate:
+            self.dropped += 1
+            return False
+        window = int(time.monotonic())
+        if window != self._window:
+            self._window = window
+            self._count = 0
+        if self._count >= self.max_per_second:
+            self.dropped += 1
+            return False
+        self._count += 1
+        return True
+
+
+def _parse_levels(levels: str) -> dict[str, str]:
+    """"app.services=DEBUG,sqlalchemy.engine=WARNING" -> {logger: level}"""
+    parsed = {}
+    for item in levels.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            parsed[name.strip()] = level.strip().upper()
+    return parsed
+
+
+_listener: QueueListener | None = None
+
+
+def setup_logging() -> None:
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter(app_settings.LOG_MAX_FIELD_LENGTH))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(DebugSampler(
+        app_settings.LOG_DEBUG_SAMPLE_RATE,
+        app_settings.LOG_DEBUG_MAX_PER_SECOND,
+    ))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(app_settings.LOG_LEVEL.upper())
+    levels = {**_DEFAULT_LEVELS, **_parse_levels(app_settings.LOG_LEVELS)}
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush what is still queued, called last on shutdown"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
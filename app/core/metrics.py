@@ -0,0 +1,206 @@
+import os
+import time
+
+import httpx
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from app.core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, circuit_breakers
+from app.core.credential_cache import credential_cache
+from app.core.response_cache import response_cache
+from app.core.retry import upstream_retry
+from app.core.token_cache import token_cache
+from app.database.database import engine, pool_stats, replica_engine
+from app.utils import crypto_pool
+
+# Upstream IVION calls take 50 ms to several seconds
+_UPSTREAM_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+UPSTREAM_LATENCY = Histogram(
+    "ivion_upstream_request_seconds",
+    "Latency of calls to the IVION API",
+    ["operation", "status"],
+    buckets=_UPSTREAM_BUCKETS,
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latency of requests served by the API",
+    ["router", "route", "method", "status"],
+)
+
+SESSION_INSERTS = Counter(
+    "ivion_session_inserts",
+    "IVION sessions stored in the session table",
+    ["source"],
+)
+
+
+class upstream_timer:
+    """
+    Times one upstream call into UPSTREAM_LATENCY. Set `status` to the
+    response status; HTTP errors raised inside are labelled with theirs,
+    calls failing before any response as "error".
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.status: int | str = "error"
+
+    def __enter__(self) -> "upstream_timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if isinstance(exc, httpx.HTTPStatusError):
+            self.status = exc.response.status_code
+        UPSTREAM_LATENCY.labels(self.operation, str(self.status)).observe(
+            time.perf_counter() - self._start
+        )
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording REQUEST_LATENCY by router and route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Unmatched paths share one label to keep the cardinality bounded
+            path = getattr(scope.get("route"), "path", None)
+            if path is None:
+                path = router = "unmatched"
+            else:
+                router = path.strip("/").split("/")[0] or "root"
+            REQUEST_LATENCY.labels(router, path, scope["method"], str(status_code)).observe(
+                time.perf_counter() - start
+            )
+
+
+class RuntimeCollector(Collector):
+    """Pool gauges and cache counters, read from their owners at scrape time"""
+
+    def collect(self):
+        connections = GaugeMetricFamily(
+            "db_pool_connections",
+            "Connections of the SQLAlchemy pool by state",
+            labels=["engine", "state"],
+        )
+        engines = [("primary", engine)]
+        if replica_engine is not None:
+            engines.append(("replica", replica_engine))
+        for name, pool_engine in engines:
+            stats = pool_stats(pool_engine)
+            connections.add_metric([name, "checked_out"], stats["checked_out"])
+            connections.add_metric([name, "checked_in"], stats["checked_in"])
+            # Negative while the pool hasn't grown to its base size yet
+            connections.add_metric([name, "overflow"], max(stats["overflow"], 0))
+            connections.add_metric([name, "size"], stats["size"])
+        yield connections
+
+        crypto = crypto_pool.stats()
+        yield GaugeMetricFamily("crypto_pool_in_flight", "Crypto jobs running or queued", value=crypto["in_flight"])
+        yield CounterMetricFamily("crypto_pool_rejected", "Crypto jobs rejected with 503", value=crypto["rejected"])
+        yield CounterMetricFamily("crypto_pool_wait_seconds", "Time crypto jobs waited for a worker", value=crypto["wait_seconds_total"])
+
+        hits = CounterMetricFamily("cache_hits", "Cache lookups served from the cache", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups that missed", labels=["cache"])
+        for name, stats in (
+            ("response", response_cache.stats()),
+            ("credential", credential_cache.stats()),
+            ("token", token_cache.stats()),
+        ):
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+        yield hits
+        yield misses
+        yield CounterMetricFamily(
+            "cache_stale_hits",
+            "Stale response cache entries served while revalidating",
+            value=response_cache.stats()["stale_hits"],
+        )
+        yield CounterMetricFamily(
+            "cache_evictions",
+            "Response cache entries evicted by the size bound",
+            value=response_cache.stats()["evictions"],
+        )
+        yield GaugeMetricFamily(
+            "cache_bytes",
+            "Approximate size of the response cache values",
+            value=response_cache.stats()["bytes"],
+        )
+
+        states = GaugeMetricFamily(
+            "ivion_circuit_state",
+            "Circuit breaker state per IVION instance, 0 closed, 1 half-open, 2 open",
+            labels=["instance"],
+        )
+        rejected = CounterMetricFamily(
+            "ivion_circuit_rejected",
+            "Upstream calls rejected by an open circuit",
+            labels=["instance"],
+        )
+        for instance, stats in circuit_breakers.stats().items():
+            states.add_metric([instance], {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}[stats["state"]])
+            rejected.add_metric([instance], stats["rejected"])
+        yield states
+        yield rejected
+
+        retry = upstream_retry.stats()
+        extra_calls = CounterMetricFamily(
+            "ivion_upstream_extra_calls",
+            "Upstream GETs sent on top of the original call",
+            labels=["kind"],
+        )
+        extra_calls.add_metric(["retry"], retry["retries"])
+        extra_calls.add_metric(["hedge"], retry["hedges"])
+        yield extra_calls
+        yield CounterMetricFamily(
+            "ivion_upstream_hedge_wins",
+            "Hedged requests that answered before the original",
+            value=retry["hedge_wins"],
+        )
+        yield CounterMetricFamily(
+            "ivion_upstream_retry_budget_exhausted",
+            "Retries or hedges skipped because the budget was spent",
+            value=retry["budget_exhausted"],
+        )
+
+
+REGISTRY.register(RuntimeCollector())
+
+
+def render_metrics() -> tuple[bytes, str]:
+    # With several uvicorn workers the histograms and counters are merged
+    # from PROMETHEUS_MULTIPROC_DIR, the runtime gauges are this worker's
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(RuntimeCollector())
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
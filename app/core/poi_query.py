@@ -0,0 +1,157 @@
+import base64
+import binascii
+from datetime import datetime
+
+from fastapi import HTTPException, status
+
+from app.api.schemas.user import PoiQuery
+
+# Keys IVION has used for the last-modified time of a POI
+_UPDATED_KEYS = ("updated_date", "updatedDate", "modified_date", "modified", "updated_at")
+
+# JSON paths IVION has used for the type and type group of a POI, in order
+# of precedence. The in-memory filters and the SQL filters of the local
+# mirror are both built from these.
+_TYPE_KEYS = ("poi_type", "poiType")
+POI_TYPE_ID_PATHS: tuple[tuple[str, ...], ...] = (
+    ("poi_type_id",),
+    ("poiTypeId",),
+    *((key, "id") for key in _TYPE_KEYS),
+)
+POI_TYPE_GROUP_ID_PATHS: tuple[tuple[str, ...], ...] = tuple(
+    path
+    for key in _TYPE_KEYS
+    for path in (
+        (key, "poi_type_group_id"),
+        (key, "poiTypeGroupId"),
+        (key, "poi_type_group", "id"),
+        (key, "poiTypeGroup", "id"),
+    )
+)
+
+
+def parse_timestamp(value) -> datetime | None:
+    """Naive local datetime from an ISO string or a unix timestamp (s or ms)"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        if isinstance(value, datetime):
+            parsed = value
+        elif isinstance(value, (int, float)):
+            # Millisecond timestamps are what the IVION frontend uses
+            return datetime.fromtimestamp(value / 1000 if value > 1e11 else value)
+        else:
+            parsed = datetime.fromisoformat(str(value))
+    except (ValueError, OverflowError, OSError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def poi_updated_at(poi: dict) -> datetime | None:
+    for key in _UPDATED_KEYS:
+        if poi.get(key) is not None:
+            return parse_timestamp(poi[key])
+    return None
+
+
+def _path_value(poi: dict, path: tuple[str, ...]):
+    value = poi
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _first_id(poi: dict, paths: tuple[tuple[str, ...], ...]) -> str | None:
+    for path in paths:
+        value = _path_value(poi, path)
+        if value is not None:
+            return str(value)
+    return None
+
+
+def poi_type_id(poi: dict) -> str | None:
+    return _first_id(poi, POI_TYPE_ID_PATHS)
+
+
+def poi_type_group_id(poi: dict) -> str | None:
+    return _first_id(poi, POI_TYPE_GROUP_ID_PATHS)
+
+
+def poi_sort_key(poi_id) -> tuple[int, str]:
+    """
+    Order of POI ids: numeric ids sort numerically (shorter first, then
+    digit by digit), the same as `ORDER BY length(id), id` on the mirror.
+    """
+    value = str(poi_id)
+    return len(value), value
+
+
+def encode_cursor(poi_id: str) -> str:
+    return base64.urlsafe_b64encode(poi_id.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    """The cursor is the opaque form of the last POI id of the previous page"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return base64.urlsafe_b64decode(padded.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+
+def project(poi: dict, fields: list[str]) -> dict:
+    if not fields:
+        return poi
+    # The id is always kept so clients can reference the POI
+    return {key: poi[key] for key in ["id", *fields] if key in poi}
+
+
+def build_page(items: list[dict], query: PoiQuery) -> dict:
+    """
+    Page out of items already filtered, ordered by id and fetched with one
+    extra element beyond `limit` to know whether there is a next page.
+    """
+    next_cursor = None
+    if query.limit and len(items) > query.limit:
+        items = items[:query.limit]
+        next_cursor = encode_cursor(str(items[-1]["id"]))
+    return {
+        "items": [project(poi, query.fields) for poi in items],
+        "next_cursor": next_cursor,
+    }
+
+
+def apply_query(pois: list[dict], query: PoiQuery) -> dict:
+    """Filter, paginate and project an in-memory POI list"""
+    poi_types = set(query.poi_type)
+    poi_type_groups = set(query.poi_type_group)
+    modified_since = parse_timestamp(query.modified_since)
+    after = poi_sort_key(decode_cursor(query.cursor)) if query.cursor else None
+
+    def matches(poi: dict) -> bool:
+        if not isinstance(poi, dict) or poi.get("id") is None:
+            return False
+        if after is not None and poi_sort_key(poi["id"]) <= after:
+            return False
+        if poi_types and poi_type_id(poi) not in poi_types:
+            return False
+        if poi_type_groups and poi_type_group_id(poi) not in poi_type_groups:
+            return False
+        if modified_since is not None:
+            updated_at = poi_updated_at(poi)
+            if updated_at is None or updated_at <= modified_since:
+                return False
+        return True
+
+    # Same order as the local mirror
+    items = sorted(filter(matches, pois), key=lambda poi: poi_sort_key(poi["id"]))
+    if query.limit:
+        items = items[:query.limit + 1]
+    return build_page(items, query)
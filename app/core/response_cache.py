@@ -0,0 +1,204 @@
+import asyncio
+import base64
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+import orjson
+from fastapi import Response
+
+from app.config import ivion_settings
+from app.database.redis import shared_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _value_size(value: Any) -> int:
+    """Approximate size of a cached value: its body or JSON length"""
+    if isinstance(value, Response):
+        return len(value.body)
+    return len(orjson.dumps(value, default=str))
+
+
+class ResponseCache:
+    """
+    LRU cache for upstream responses keyed by (endpoint, key) with a TTL
+    per endpoint, bounded both by entry count and by approximate bytes.
+
+    Entries past their TTL stay servable for `stale_ttl` more seconds
+    (stale-while-revalidate): the caller gets the stale value immediately
+    and a single background task fetches a fresh one. Older entries are
+    kept until evicted, as a fallback while upstream is unavailable.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        max_entry_bytes: int,
+        ttls: dict[str, float],
+        stale_ttl: float,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttls = ttls
+        self.stale_ttl = stale_ttl
+        # (endpoint, key) -> (stored_at, value, size)
+        self._entries: OrderedDict[tuple[str, Hashable], tuple[float, Any, int]] = OrderedDict()
+        self.bytes = 0
+        self._revalidating: dict[tuple[str, Hashable], asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.fallback_hits = 0
+        self.oversized = 0
+
+    def get(self, endpoint: str, key: Hashable) -> tuple[Any, bool] | None:
+        """Return (value, is_fresh) or None when there is nothing servable"""
+        cache_key = (endpoint, key)
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stored_at, value, _ = entry
+        age = time.monotonic() - stored_at
+        ttl = self.ttls.get(endpoint, 0)
+        if age > ttl + self.stale_ttl:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(cache_key)
+        if age > ttl:
+            self.stale_hits += 1
+            return value, False
+        self.hits += 1
+        return value, True
+
+    def fallback(self, endpoint: str, key: Hashable, max_age: float) -> Any | None:
+        """Value of any age up to `max_age`, for when upstream can't be reached"""
+        entry = self._entries.get((endpoint, key))
+        if entry is None or time.monotonic() - entry[0] > max_age:
+            return None
+        self.fallback_hits += 1
+        return entry[1]
+
+    def set(self, endpoint: str, key: Hashable, value: Any, age: float = 0.0) -> None:
+        """`age` is for values that were already cached elsewhere for a while"""
+        size = _value_size(value)
+        # The previous value is outdated either way
+        self.invalidate(endpoint, key)
+        if size > self.max_entry_bytes:
+            self.oversized += 1
+            return
+
+        self._entries[(endpoint, key)] = (time.monotonic() - age, value, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def invalidate(self, endpoint: str, key: Hashable) -> None:
+        entry = self._entries.pop((endpoint, key), None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+    def revalidate(
+        self,
+        endpoint: str,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[Any]],
+    ) -> None:
+        """Refresh an entry in the background, at most once at a time per key"""
+        cache_key = (endpoint, key)
+        if cache_key in self._revalidating:
+            return
+
+        async def _refresh():
+            try:
+                self.set(endpoint, key, await fetch())
+            except Exception as e:
+                logger.warning("Revalidating %s %s failed: %s", endpoint, key, e)
+            finally:
+                self._revalidating.pop(cache_key, None)
+
+        self._revalidating[cache_key] = asyncio.create_task(_refresh())
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "fallback_hits": self.fallback_hits,
+            "oversized": self.oversized,
+        }
+
+
+response_cache = ResponseCache(
+    max_entries=ivion_settings.RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=ivion_settings.RESPONSE_CACHE_MAX_BYTES,
+    max_entry_bytes=ivion_settings.RESPONSE_CACHE_MAX_ENTRY_BYTES,
+    ttls={
+        "siteInfo": ivion_settings.SITE_INFO_CACHE_TTL_SECONDS,
+        "siteInfoData": ivion_settings.SITE_INFO_CACHE_TTL_SECONDS,
+        "sitePois": ivion_settings.SITE_POIS_CACHE_TTL_SECONDS,
+        "sitePoisData": ivion_settings.SITE_POIS_CACHE_TTL_SECONDS,
+    },
+    stale_ttl=ivion_settings.RESPONSE_CACHE_STALE_SECONDS,
+)
+
+
+# Shared (Redis) copies of the cached responses. The wall clock time they
+# were stored at travels along so every worker agrees on their age.
+
+def _encode(value: Any) -> bytes:
+    if isinstance(value, Response):
+        value = {
+            "response": {
+                "status_code": value.status_code,
+                "media_type": value.media_type,
+                "body": base64.b64encode(value.body).decode(),
+            }
+        }
+    else:
+        value = {"value": value}
+    return orjson.dumps({"stored_at": time.time(), **value})
+
+
+def _decode(raw: bytes) -> tuple[Any, float]:
+    entry = orjson.loads(raw)
+    age = max(time.time() - entry["stored_at"], 0.0)
+    if "response" in entry:
+        response = entry["response"]
+        return Response(
+            content=base64.b64decode(response["body"]),
+            status_code=response["status_code"],
+            media_type=response["media_type"],
+        ), age
+    return entry["value"], age
+
+
+async def get_shared_response(endpoint: str, key: Hashable) -> tuple[Any, float] | None:
+    """(value, age in seconds) stored by any worker, or None"""
+    raw = await shared_cache.get(f"response:{endpoint}:{key}")
+    if raw is None:
+        return None
+    return _decode(raw)
+
+
+async def set_shared_response(endpoint: str, key: Hashable, value: Any) -> None:
+    if value is None:
+        return
+    ttl = response_cache.ttls.get(endpoint, 0) + response_cache.stale_ttl
+    await shared_cache.set(f"response:{endpoint}:{key}", _encode(value), ttl)
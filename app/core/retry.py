@@ -0,0 +1,193 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable
+
+import httpx
+
+from app.config import ivion_settings
+
+
+class RetryBudget:
+    """
+    Caps the extra upstream calls (retries and hedges) at `ratio` of the
+    original calls. Every original call deposits `ratio` tokens, every
+    extra call withdraws one; at most `burst` tokens are saved up.
+    """
+
+    def __init__(self, ratio: float, burst: int):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = float(burst)
+        self.exhausted = 0
+
+    def deposit(self) -> None:
+        self._tokens = min(self._tokens + self.ratio, self.burst)
+
+    def withdraw(self) -> bool:
+        if self._tokens < 1:
+            self.exhausted += 1
+            return False
+        self._tokens -= 1
+        return True
+
+
+class LatencyTracker:
+    """Recent latencies of one operation and their quantile"""
+
+    def __init__(self, quantile: float, window: int = 500):
+        self.quantile = quantile
+        self._samples: deque[float] = deque(maxlen=window)
+        self._since_update = 0
+        self._value: float | None = None
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._since_update += 1
+
+    def value(self, min_samples: int) -> float | None:
+        if len(self._samples) < min_samples:
+            return None
+        # Sorting is cheap at this size, but not worth doing on every call
+        if self._value is None or self._since_update >= 20:
+            ordered = sorted(self._samples)
+            self._value = ordered[min(int(len(ordered) * self.quantile), len(ordered) - 1)]
+            self._since_update = 0
+        return self._value
+
+
+class UpstreamRetry:
+    """
+    Runs an idempotent upstream GET with retries and, optionally, a hedged
+    second request.
+
+    Connection errors, timeouts and `retry_statuses` responses are retried
+    up to `attempts` calls in total, waiting a random time between 0 and
+    an exponentially growing cap (full jitter). With hedging on, a second
+    request is sent when the first has not answered after the observed
+    latency quantile of the operation, and the first good response wins.
+    Retries and hedges both draw from the RetryBudget.
+    """
+
+    def __init__(
+        self,
+        attempts: int,
+        base_delay: float,
+        max_delay: float,
+        retry_statuses: set[int],
+        budget: RetryBudget,
+        hedging: bool,
+        hedge_quantile: float,
+        hedge_min_delay: float,
+        hedge_min_samples: int,
+    ):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = retry_statuses
+        self.budget = budget
+        self.hedging = hedging
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies: dict[str, LatencyTracker] = {}
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def backoff(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+    def _tracker(self, operation: str) -> LatencyTracker:
+        tracker = self._latencies.get(operation)
+        if tracker is None:
+            tracker = self._latencies[operation] = LatencyTracker(self.hedge_quantile)
+        return tracker
+
+    async def run(
+        self,
+        operation: str,
+        send: Callable[[], Awaitable[httpx.Response]],
+    ) -> httpx.Response:
+        self.budget.deposit()
+        attempt = 1
+        while True:
+            try:
+                response = await self._attempt(operation, send)
+            except httpx.TransportError:
+                if attempt >= self.attempts or not self.budget.withdraw():
+                    raise
+            else:
+                if (
+                    response.status_code not in self.retry_statuses
+                    or attempt >= self.attempts
+                    or not self.budget.withdraw()
+                ):
+                    return response
+            self.retries += 1
+            await asyncio.sleep(self.backoff(attempt))
+            attempt += 1
+
+    async def _timed(self, operation: str, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        start = time.perf_counter()
+        response = await send()
+        self._tracker(operation).observe(time.perf_counter() - start)
+        return response
+
+    async def _attempt(self, operation: str, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        delay = self._tracker(operation).value(self.hedge_min_samples) if self.hedging else None
+        if delay is None:
+            return await self._timed(operation, send)
+
+        first = asyncio.ensure_future(self._timed(operation, send))
+        done, _ = await asyncio.wait({first}, timeout=max(delay, self.hedge_min_delay))
+        if done or not self.budget.withdraw():
+            return await first
+
+        self.hedges += 1
+        hedge = asyncio.ensure_future(self._timed(operation, send))
+        pending = {first, hedge}
+        fallback: asyncio.Future | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().status_code not in self.retry_statuses:
+                        self.hedge_wins += task is hedge
+                        return task.result()
+                    # A response to retry beats an exception
+                    if fallback is None or task.exception() is None:
+                        fallback = task
+            return fallback.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "budget_exhausted": self.budget.exhausted,
+            "hedge_delays": {
+                operation: tracker.value(self.hedge_min_samples)
+                for operation, tracker in self._latencies.items()
+            },
+        }
+
+
+upstream_retry = UpstreamRetry(
+    attempts=ivion_settings.UPSTREAM_RETRY_ATTEMPTS,
+    base_delay=ivion_settings.UPSTREAM_RETRY_BASE_DELAY_SECONDS,
+    max_delay=ivion_settings.UPSTREAM_RETRY_MAX_DELAY_SECONDS,
+    retry_statuses=ivion_settings.UPSTREAM_RETRY_STATUSES,
+    budget=RetryBudget(
+        ratio=ivion_settings.UPSTREAM_RETRY_BUDGET_RATIO,
+        burst=ivion_settings.UPSTREAM_RETRY_BUDGET_BURST,
+    ),
+    hedging=ivion_settings.UPSTREAM_HEDGING_ENABLED,
+    hedge_quantile=ivion_settings.UPSTREAM_HEDGE_QUANTILE,
+    hedge_min_delay=ivion_settings.UPSTREAM_HEDGE_MIN_DELAY_SECONDS,
+    hedge_min_samples=ivion_settings.UPSTREAM_HEDGE_MIN_SAMPLES,
+)
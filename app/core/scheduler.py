@@ -0,0 +1,145 @@
+import abc
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from app.api.schemas.user import SiteUser
+from app.config import database_settings, ivion_settings
+from app.core.http import IvionHttpClients
+from app.core.token_cache import TokenKey, token_cache, token_cache_key
+from app.database.database import async_session_factory, engine
+from app.database.retention import drop_expired_session_partitions, ensure_session_partitions
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask(abc.ABC):
+    """Runs `run_once` every `interval` seconds in a background asyncio task"""
+
+    name = "periodic task"
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.http_clients: IvionHttpClients | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self, http_clients: IvionHttpClients) -> None:
+        self.http_clients = http_clients
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("%s run failed", self.name)
+
+    @abc.abstractmethod
+    async def run_once(self) -> None:
+        """One run of the task, exceptions are logged and the loop goes on"""
+
+
+class TokenRefreshScheduler(PeriodicTask):
+    """
+    Background task that renews the IVION session of every recently used
+    account shortly before its access token expires, so request paths
+    always find a warm token.
+    """
+
+    name = "Token refresh"
+
+    def __init__(self, interval: float, lead: timedelta, idle: timedelta):
+        super().__init__(interval)
+        self.lead = lead
+        self.idle = idle
+        # Accounts seen on the request path and when they were last used
+        self._accounts: dict[TokenKey, tuple[SiteUser, datetime]] = {}
+
+    def track(self, site_user: SiteUser) -> None:
+        self._accounts[token_cache_key(site_user)] = (site_user, datetime.now())
+
+    def _due(self) -> list[SiteUser]:
+        now = datetime.now()
+        due = []
+        for key, (site_user, last_used) in list(self._accounts.items()):
+            if now - last_used > self.idle:
+                self._accounts.pop(key, None)
+                continue
+            entry = token_cache.peek(key)
+            if entry is None or entry["expering_at"] - self.lead <= now:
+                due.append(site_user)
+        return due
+
+    async def run_once(self) -> None:
+        # Imported here, the service itself registers accounts with us
+        from app.services.openpack import OpenpackService
+
+        for site_user in self._due():
+            async with async_session_factory() as session:
+                service = OpenpackService(session, self.http_clients)
+                try:
+                    await service.renew_session(site_user)
+                except Exception as e:
+                    logger.warning("Token refresh failed for user %s: %s", site_user.user_id, e)
+
+
+class PoiSyncScheduler(PeriodicTask):
+    """Periodically re-syncs every site already mirrored into the poi table"""
+
+    name = "POI sync"
+
+    async def run_once(self) -> None:
+        from app.services.openpack import OpenpackService
+        from app.services.poi import PoiService
+
+        async with async_session_factory() as session:
+            site_ids = await PoiService(session, None).get_synced_site_ids()
+
+        for site_id in site_ids:
+            async with async_session_factory() as session:
+                service = PoiService(session, OpenpackService(session, self.http_clients))
+                try:
+                    await service.sync_site(site_id)
+                except Exception as e:
+                    logger.warning("POI sync failed for site %s: %s", site_id, e)
+
+
+class SessionRetentionJob(PeriodicTask):
+    """Keeps future session partitions created and drops expired ones"""
+
+    name = "Session retention"
+
+    async def run_once(self) -> None:
+        async with engine.begin() as conn:
+            await ensure_session_partitions(conn)
+        # Runs its own transactions, a detach may not run inside one
+        dropped = await drop_expired_session_partitions(engine)
+        if dropped:
+            logger.info("Dropped expired session partitions: %s", ", ".join(dropped))
+
+
+token_refresher = TokenRefreshScheduler(
+    interval=ivion_settings.TOKEN_REFRESH_INTERVAL_SECONDS,
+    lead=timedelta(seconds=ivion_settings.TOKEN_REFRESH_LEAD_SECONDS),
+    idle=timedelta(seconds=ivion_settings.TOKEN_REFRESH_IDLE_SECONDS),
+)
+
+poi_syncer = PoiSyncScheduler(
+    interval=ivion_settings.POI_SYNC_INTERVAL_SECONDS,
+)
+
+session_retention = SessionRetentionJob(
+    interval=database_settings.SESSION_RETENTION_INTERVAL_SECONDS,
+)
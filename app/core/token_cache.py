@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+from uuid import UUID
+
+import orjson
+
+from app.api.schemas.user import SiteUser
+from app.config import ivion_settings
+from app.database.redis import shared_cache
+
+
+TokenKey = tuple[str, str, str]
+
+
+def token_cache_key(site_user: SiteUser) -> TokenKey:
+    return (
+        str(site_user.user_id),
+        str(site_user.site_id),
+        site_user.instance_url.rstrip("/"),
+    )
+
+
+class TokenCache:
+    """
+    In-memory store of the newest valid IVION session per
+    (user_id, site_id, instance_url).
+
+    Entries are the dumped `Session` rows, so `data` holds the upstream
+    token payload and `expering_at` decides whether the entry can be used.
+    """
+
+    def __init__(self, margin: timedelta):
+        self.margin = margin
+        self._entries: dict[TokenKey, dict] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def is_valid(self, entry: dict) -> bool:
+        return entry["expering_at"] - self.margin > datetime.now()
+
+    def get(self, key: TokenKey) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is None or not self.is_valid(entry):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def peek(self, key: TokenKey) -> dict | None:
+        """Last known entry even if expired, e.g. to reuse its refresh token"""
+        return self._entries.get(key)
+
+    def set(self, key: TokenKey, entry: dict) -> None:
+        current = self._entries.get(key)
+        # Never replace a newer session with an older one
+        if current is not None and current["created_at"] > entry["created_at"]:
+            return
+        self._entries[key] = entry
+
+    def invalidate(self, key: TokenKey) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+token_cache = TokenCache(
+    margin=timedelta(seconds=ivion_settings.TOKEN_EXPIRY_MARGIN_SECONDS),
+)
+
+
+def _shared_key(key: TokenKey) -> str:
+    return "token:" + "|".join(key)
+
+
+async def get_shared_session(key: TokenKey) -> dict | None:
+    """Valid session another worker stored in Redis, if any"""
+    raw = await shared_cache.get(_shared_key(key))
+    if raw is None:
+        return None
+    entry = orjson.loads(raw)
+    for field in ("id", "user_id", "site_id"):
+        entry[field] = UUID(entry[field])
+    for field in ("created_at", "expering_at"):
+        entry[field] = datetime.fromisoformat(entry[field])
+    return entry if token_cache.is_valid(entry) else None
+
+
+async def set_shared_session(key: TokenKey, entry: dict) -> None:
+    # Expires in Redis when it stops being usable locally
+    ttl = entry["expering_at"] - token_cache.margin - datetime.now()
+    await shared_cache.set(_shared_key(key), orjson.dumps(entry), ttl.total_seconds())
+
+
+async def delete_shared_session(key: TokenKey) -> None:
+    await shared_cache.delete(_shared_key(key))
@@ -0,0 +1,399 @@
+import functools
+import inspect
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+import httpx
+import orjson
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import app_settings
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# Spans kept per trace before the rest are dropped
+_MAX_SPANS_PER_TRACE = 1000
+_MAX_STATEMENT_LENGTH = 500
+
+
+class Span:
+    """One timed operation. Unsampled spans only carry the ids."""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "kind", "sampled",
+        "is_root", "attributes", "start_ns", "end_ns", "status", "status_message",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str | None,
+        kind: int,
+        sampled: bool,
+        is_root: bool = False,
+        attributes: dict | None = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64).to_bytes(8, "big").hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.sampled = sampled
+        self.is_root = is_root
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.status = 0
+        self.status_message = ""
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.sampled:
+            self.attributes[key] = value
+
+    def record_exception(self, e: BaseException) -> None:
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(e).__name__}: {e}"[:500]
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": self.status, "message": self.status_message},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def parse_traceparent(header: str | None) -> tuple[str, str, bool] | None:
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class TraceExporter:
+    """
+    Writes finished traces as OTLP/JSON `resourceSpans` documents, one per
+    line, from a background thread so the event loop never blocks on I/O.
+    """
+
+    def __init__(self, target: str, service_name: str):
+        self.target = target
+        self.resource = {
+            "attributes": [_otlp_attribute("service.name", service_name)],
+        }
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+
+    def export(self, spans: list[Span]) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._write_loop, name="trace-exporter", daemon=True)
+            self._thread.start()
+        self._queue.put(spans)
+
+    def _document(self, spans: list[Span]) -> bytes:
+        return orjson.dumps({
+            "resourceSpans": [{
+                "resource": self.resource,
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [span.to_otlp() for span in spans],
+                }],
+            }],
+        })
+
+    def _write_loop(self) -> None:
+        out = sys.stdout.buffer if self.target == "stdout" else open(self.target, "ab")
+        try:
+            while True:
+                spans = self._queue.get()
+                if spans is None:
+                    break
+                out.write(self._document(spans) + b"\n")
+                out.flush()
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+
+    def shutdown(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class Tracer:
+    """
+    Minimal in-process tracer. The sampling decision is made once per
+    trace, at its root; spans of unsampled traces are never created, only
+    the trace id is propagated.
+    """
+
+    def __init__(self, enabled: bool, sample_rate: float, exporter: TraceExporter):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        # trace_id -> finished spans, until the local root span ends
+        self._traces: dict[str, list[Span]] = {}
+
+    def _new_span(
+        self,
+        name: str,
+        kind: int,
+        attributes: dict | None,
+        remote_parent: tuple[str, str, bool] | None = None,
+    ) -> Span | None:
+        parent = _current_span.get()
+        if parent is not None:
+            if not parent.sampled:
+                return None
+            return Span(name, parent.trace_id, parent.span_id, kind, True, attributes=attributes)
+
+        if remote_parent is not None:
+            trace_id, parent_id, sampled = remote_parent
+        else:
+            trace_id = random.getrandbits(128).to_bytes(16, "big").hex()
+            parent_id = None
+            sampled = random.random() < self.sample_rate
+        span = Span(name, trace_id, parent_id, kind, sampled, is_root=True, attributes=attributes)
+        if sampled:
+            self._traces[trace_id] = []
+        return span
+
+    def _finish(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        if not span.sampled:
+            return
+        if span.is_root:
+            spans = self._traces.pop(span.trace_id, [])
+            spans.append(span)
+            self.exporter.export(spans)
+            return
+        spans = self._traces.get(span.trace_id)
+        if spans is None:
+            # Outlived its request, e.g. a background revalidation
+            self.exporter.export([span])
+        elif len(spans) < _MAX_SPANS_PER_TRACE:
+            spans.append(span)
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        kind: int = KIND_INTERNAL,
+        attributes: dict | None = None,
+        remote_parent: tuple[str, str, bool] | None = None,
+    ) -> Iterator[Span | None]:
+        if not self.enabled:
+            yield None
+            return
+        span = self._new_span(name, kind, attributes, remote_parent)
+        if span is None:
+            # Inside an unsampled trace, the parent stays current
+            yield _current_span.get()
+            return
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    def start_leaf(self, name: str, kind: int, attributes: dict | None = None) -> Span | None:
+        """Span that never becomes current, for event based instrumentation"""
+        parent = _current_span.get()
+        if not self.enabled or parent is None or not parent.sampled:
+            return None
+        return Span(name, parent.trace_id, parent.span_id, kind, True, attributes=attributes)
+
+    def end_leaf(self, span: Span | None) -> None:
+        if span is not None:
+            self._finish(span)
+
+    def shutdown(self) -> None:
+        self.exporter.shutdown()
+
+
+tracer = Tracer(
+    enabled=app_settings.TRACING_ENABLED,
+    sample_rate=app_settings.TRACING_SAMPLE_RATE,
+    exporter=TraceExporter(app_settings.TRACING_EXPORT_TO, app_settings.TRACING_SERVICE_NAME),
+)
+
+
+def trace_methods(cls):
+    """Class decorator giving every coroutine method its own span"""
+    for name, member in list(vars(cls).items()):
+        if name.startswith("__") or not inspect.iscoroutinefunction(member):
+            continue
+        setattr(cls, name, _traced(f"{cls.__name__}.{name}", member))
+    return cls
+
+
+def _traced(span_name: str, fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        if not tracer.enabled:
+            return await fn(*args, **kwargs)
+        with tracer.span(span_name):
+            return await fn(*args, **kwargs)
+    return wrapper
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening the root span of every request. An incoming
+    W3C traceparent is continued, and the trace id is returned in the
+    traceparent and X-Trace-Id response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        remote_parent = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        method = scope["method"]
+
+        with tracer.span(f"{method} {scope['path']}", KIND_SERVER, remote_parent=remote_parent) as span:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    span.set_attribute("http.response.status_code", status_code)
+                    if status_code >= 500:
+                        span.status = STATUS_ERROR
+                    message.setdefault("headers", [])
+                    message["headers"] = [
+                        *message["headers"],
+                        (b"traceparent", span.traceparent.encode()),
+                        (b"x-trace-id", span.trace_id.encode()),
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # The route template is known once routing is done
+                route = getattr(scope.get("route"), "path", None)
+                if route is not None:
+                    span.name = f"{method} {route}"
+                    span.set_attribute("http.route", route)
+                span.set_attribute("http.request.method", method)
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """httpx transport wrapper with a client span per upstream request"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        span = tracer.start_leaf(
+            f"HTTP {request.method}",
+            KIND_CLIENT,
+            {"http.request.method": request.method, "url.full": str(request.url.copy_with(query=None))},
+        )
+        if span is None:
+            return await self.transport.handle_async_request(request)
+
+        request.headers["traceparent"] = span.traceparent
+        try:
+            response = await self.transport.handle_async_request(request)
+            span.set_attribute("http.response.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.status = STATUS_ERROR
+            return response
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            # Streamed bodies are read later, the span ends at the headers
+            tracer.end_leaf(span)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Client span around every SQL statement run through the engine"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._trace_span = tracer.start_leaf(
+            statement.split(None, 1)[0].upper() if statement else "SQL",
+            KIND_CLIENT,
+            {"db.system": "postgresql", "db.statement": statement[:_MAX_STATEMENT_LENGTH]},
+        )
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        tracer.end_leaf(getattr(context, "_trace_span", None))
+        context._trace_span = None
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        context = exception_context.execution_context
+        span = getattr(context, "_trace_span", None)
+        if span is not None:
+            span.record_exception(exception_context.original_exception)
+            tracer.end_leaf(span)
+            context._trace_span = None
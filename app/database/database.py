@@ -1,34 +1,201 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+import asyncio
+import logging
+import time
+from typing import Annotated
+from uuid import uuid4
+
+from fastapi import Depends
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlmodel import SQLModel
 import os
 from dotenv import load_dotenv
 
+from app.config import database_settings
+
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
 # Make sure to use asyncpg driver for async PostgreSQL
-DATABASE_URL = (
-    f"postgresql+asyncpg://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}"
-    f"@{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DB')}"
+def _database_url(host: str | None, port) -> str:
+    return (
+        f"postgresql+asyncpg://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}"
+        f"@{host}:{port}/{os.getenv('POSTGRES_DB')}"
+    )
+
+DATABASE_URL = _database_url(os.getenv('POSTGRES_HOST'), os.getenv('POSTGRES_PORT'))
+
+
+def _connect_args() -> dict:
+    if database_settings.DB_PGBOUNCER_MODE:
+        return {
+            # asyncpg's own cache and SQLAlchemy's cache on top of it
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            # Unnamed statements may collide between pgbouncer clients
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {
+        "statement_cache_size": database_settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": database_settings.DB_STATEMENT_CACHE_SIZE,
+    }
+
+
+def _create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        # database type/dialect and file name
+        url=url,
+        # Log sql queries
+        echo=database_settings.DB_ECHO,
+        pool_size=database_settings.DB_POOL_SIZE,
+        max_overflow=database_settings.DB_MAX_OVERFLOW,
+        pool_timeout=database_settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=database_settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=database_settings.DB_POOL_PRE_PING,
+        connect_args=_connect_args(),
+    )
+
+
+engine = _create_engine(DATABASE_URL)
+
+# Shared by requests, background jobs and the CLI
+async_session_factory = async_sessionmaker(
+    bind=engine, class_=AsyncSession, expire_on_commit=False,
 )
-engine = create_async_engine(
-    # database type/dialect and file name
-    url=DATABASE_URL,
-    # Log sql queries
-    # echo=True,
+
+
+# Read-only engine, only when a replica is configured
+replica_engine: AsyncEngine | None = None
+read_session_factory: async_sessionmaker | None = None
+if database_settings.POSTGRES_REPLICA_HOST:
+    replica_engine = _create_engine(_database_url(
+        database_settings.POSTGRES_REPLICA_HOST,
+        database_settings.POSTGRES_REPLICA_PORT or os.getenv('POSTGRES_PORT'),
+    ))
+    read_session_factory = async_sessionmaker(
+        bind=replica_engine, class_=AsyncSession, expire_on_commit=False,
+    )
+
+
+class ReplicaMonitor:
+    """
+    Tracks the replication lag of the read replica. A background task
+    measures it every `interval`, requests only read the last result:
+    while the lag is above `max_lag`, the replica can't be reached within
+    `timeout` or the last measurement is too old, reads go to the primary.
+    """
+
+    def __init__(self, engine: AsyncEngine | None, max_lag: float, interval: float, timeout: float):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.interval = interval
+        self.timeout = timeout
+        self.lag: float | None = None
+        self.checked_at = 0.0
+        self.fallbacks = 0
+        self._task: asyncio.Task | None = None
+
+    async def _query_lag(self) -> float:
+        async with self.engine.connect() as conn:
+            # A replica that replayed everything it received is not
+            # lagging, however old its last replayed transaction is
+            result = await conn.execute(text(
+                "SELECT CASE "
+                "WHEN NOT pg_is_in_recovery() THEN 0 "
+                "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+                "END"
+            ))
+            return float(result.scalar_one())
+
+    async def measure(self) -> None:
+        try:
+            self.lag = await asyncio.wait_for(self._query_lag(), self.timeout)
+        except Exception as e:
+            logger.warning("Replica lag check failed: %r", e)
+            self.lag = None
+        self.checked_at = time.monotonic()
+
+    async def _run(self) -> None:
+        while True:
+            await self.measure()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self.engine is not None and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def is_usable(self) -> bool:
+        """Never waits on the replica, only reads the last measurement"""
+        if self.engine is None:
+            return False
+        # A measurement the background task failed to renew is not trusted
+        fresh = time.monotonic() - self.checked_at <= 2 * self.interval + self.timeout
+        usable = fresh and self.lag is not None and self.lag <= self.max_lag
+        if not usable:
+            self.fallbacks += 1
+        return usable
+
+    def stats(self) -> dict:
+        return {
+            "configured": self.engine is not None,
+            "lag_seconds": self.lag,
+            "max_lag_seconds": self.max_lag,
+            "fallbacks": self.fallbacks,
+        }
+
+
+replica_monitor = ReplicaMonitor(
+    replica_engine,
+    max_lag=database_settings.DB_REPLICA_MAX_LAG_SECONDS,
+    interval=database_settings.DB_REPLICA_LAG_CHECK_INTERVAL_SECONDS,
+    timeout=database_settings.DB_REPLICA_LAG_CHECK_TIMEOUT_SECONDS,
 )
 
+
+def pool_stats(engine: AsyncEngine = engine) -> dict:
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": database_settings.DB_MAX_OVERFLOW,
+    }
+
+
 async def create_db_and_tables():
     async with engine.begin() as conn:
         # Import models here to ensure they're registered with SQLModel.metadata
         from .models import User  # noqa: F401
+        from .retention import ensure_session_partitions
         await conn.run_sync(SQLModel.metadata.create_all)
+        # A partitioned session table takes no rows without partitions,
+        # whether or not the retention job runs
+        await ensure_session_partitions(conn, days_ahead=1)
 
 # Dependency for FastAPI
 async def get_session():
-    async_session = sessionmaker(
-        bind=engine, class_=AsyncSession, expire_on_commit=False,
-    )
+    async with async_session_factory() as session:
+        yield session
+
 
-    async with async_session() as session:
-        yield session
\ No newline at end of file
+# Dependency for read-only queries. Without a usable replica it is the
+# request's primary session, so no second connection is taken.
+async def get_read_session(session: Annotated[AsyncSession, Depends(get_session)]):
+    if read_session_factory is None or not replica_monitor.is_usable():
+        yield session
+        return
+    async with read_session_factory() as read_session:
+        yield read_session
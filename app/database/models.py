@@ -92,7 +92,7 @@
 #     )
 
 import json
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, UniqueConstraint
 from sqlmodel import SQLModel, Field
 from datetime import datetime
 from typing import Optional
@@ -239,6 +239,10 @@ class User(SQLModel, table=True):
 
 
 class Poi(SQLModel, table=True):
+    # Local mirror of the IVION POIs of a site, one row per upstream POI
+    __table_args__ = (
+        UniqueConstraint("site_id", "ivion_poi_id", name="uq_poi_site_ivion_poi"),
+    )
     id: UUID = Field(
         sa_column=Column(
             postgresql.UUID,
@@ -247,14 +251,39 @@ class Poi(SQLModel, table=True):
         )
     )
     poi_url: str
-    site_id: str
+    site_id: str = Field(index=True)
+    ivion_poi_id: str
+    data: Optional[dict] = Field(
+        sa_column=Column(postgresql.JSONB, nullable=True),
+        default=None,
+    )
+    # md5 of the upstream payload, unchanged POIs are not rewritten
+    data_hash: str
+    # Upstream last-modified time when IVION reports one
+    updated_at: Optional[datetime] = None
+    synced_at: datetime = Field(default_factory=datetime.now)
 #     site_id: UUID = Field(foreign_key="site.id")
 #     site: Site = Relationship(back_populates="pois",
 #         sa_relationship_kwargs={"lazy": "selectin"},
 #     )
 
 
+class PoiSyncState(SQLModel, table=True):
+    __tablename__ = "poi_sync_state"
+    site_id: str = Field(primary_key=True)
+    synced_at: datetime
+    # Newest upstream modification time seen in the last sync
+    watermark: Optional[datetime] = None
+    poi_count: int = 0
+
+
 class Session(SQLModel, table=True):
+    # Range partitioned by created_at (daily partitions, see
+    # app/database/retention.py), so the partition key is part of the PK
+    __table_args__ = (
+        Index("ix_session_user_site_expering", "user_id", "site_id", "expering_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
     id: UUID = Field(
         sa_column=Column(
             postgresql.UUID,
@@ -266,6 +295,7 @@ class Session(SQLModel, table=True):
         sa_column=Column(
             postgresql.TIMESTAMP,
             default=datetime.now,
+            primary_key=True,
         )
     )
     expering_at: datetime
@@ -0,0 +1,151 @@
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from redis.asyncio import Redis
+from redis.exceptions import LockError, RedisError
+
+from app.config import database_settings
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCache:
+    """
+    Optional Redis store shared by every worker and container.
+
+    Every operation degrades to a no-op when Redis is not configured or
+    not reachable: reads miss, writes are dropped and locks are granted
+    right away, so callers fall back to their local caches. After an error
+    Redis is left alone for `retry_after` seconds.
+    """
+
+    def __init__(
+        self,
+        url: str | None,
+        prefix: str,
+        retry_after: float,
+        lock_timeout: float,
+        lock_wait: float,
+        socket_timeout: float = 1.0,
+        client: Redis | None = None,
+    ):
+        self.url = url
+        self.prefix = prefix
+        self.retry_after = retry_after
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+        self.socket_timeout = socket_timeout
+        # A client can be passed in, e.g. an in-memory stand-in
+        self._client = client
+        self._down_until = 0.0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.url is not None or self._client is not None
+
+    def _get_client(self) -> Redis | None:
+        if not self.enabled or time.monotonic() < self._down_until:
+            return None
+        if self._client is None:
+            self._client = Redis.from_url(
+                self.url,
+                socket_timeout=self.socket_timeout,
+                socket_connect_timeout=self.socket_timeout,
+            )
+        return self._client
+
+    def _failed(self, action: str, e: Exception) -> None:
+        self.errors += 1
+        self._down_until = time.monotonic() + self.retry_after
+        logger.warning("Redis %s failed, using local caches only: %s", action, e)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    async def get(self, key: str) -> bytes | None:
+        client = self._get_client()
+        if client is None:
+            return None
+        try:
+            return await client.get(self._key(key))
+        except (RedisError, OSError) as e:
+            self._failed("get", e)
+            return None
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        client = self._get_client()
+        if client is None or ttl <= 0:
+            return
+        try:
+            await client.set(self._key(key), value, px=int(ttl * 1000))
+        except (RedisError, OSError) as e:
+            self._failed("set", e)
+
+    async def delete(self, key: str) -> None:
+        client = self._get_client()
+        if client is None:
+            return
+        try:
+            await client.delete(self._key(key))
+        except (RedisError, OSError) as e:
+            self._failed("delete", e)
+
+    @asynccontextmanager
+    async def lock(self, name: str) -> AsyncIterator[bool]:
+        """
+        Hold a cluster-wide lock, yielding whether it was acquired. When
+        Redis is down or the wait times out the body runs anyway: a
+        duplicate login is better than a failed request.
+        """
+        client = self._get_client()
+        if client is None:
+            yield False
+            return
+
+        lock = client.lock(
+            self._key(f"lock:{name}"),
+            timeout=self.lock_timeout,
+            blocking_timeout=self.lock_wait,
+        )
+        try:
+            acquired = await lock.acquire()
+        except (RedisError, OSError) as e:
+            self._failed("lock", e)
+            acquired = False
+
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    await lock.release()
+                except LockError:
+                    # Expired while held, someone else may own it by now
+                    pass
+                except (RedisError, OSError) as e:
+                    self._failed("unlock", e)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "available": self.enabled and time.monotonic() >= self._down_until,
+            "errors": self.errors,
+        }
+
+
+shared_cache = SharedCache(
+    url=database_settings.REDIS_URL,
+    prefix=database_settings.REDIS_KEY_PREFIX,
+    retry_after=database_settings.REDIS_RETRY_SECONDS,
+    lock_timeout=database_settings.REDIS_LOCK_TIMEOUT_SECONDS,
+    lock_wait=database_settings.REDIS_LOCK_WAIT_SECONDS,
+    socket_timeout=database_settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+)
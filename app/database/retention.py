@@ -0,0 +1,158 @@
+import logging
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.config import database_settings
+
+logger = logging.getLogger(__name__)
+
+# Daily partitions of the session table are named session_pYYYYMMDD
+_PARTITION_PREFIX = "session_p"
+
+
+def _partition_name(day: date) -> str:
+    return f"{_PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+async def _is_partitioned(conn: AsyncConnection) -> bool:
+    result = await conn.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = 'session' AND relkind IN ('r', 'p')")
+    )
+    return result.scalar_one_or_none() == "p"
+
+
+async def _partition_names(conn: AsyncConnection) -> list[str]:
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'session'"
+    ))
+    return list(result.scalars().all())
+
+
+async def ensure_session_partitions(conn: AsyncConnection, days_ahead: int | None = None) -> list[str]:
+    """
+    Create the default partition and daily partitions up to `days_ahead`
+    days ahead. A daily partition that can't be created, e.g. because
+    session_default already holds rows of that day, is skipped: those rows
+    keep landing in the default partition.
+    """
+    if days_ahead is None:
+        days_ahead = database_settings.SESSION_PARTITION_DAYS_AHEAD
+    if not await _is_partitioned(conn):
+        return []
+
+    existing = set(await _partition_names(conn))
+    if "session_default" not in existing:
+        try:
+            # Workers starting together race on it, the loser only logs
+            async with conn.begin_nested():
+                await conn.execute(text(
+                    "CREATE TABLE IF NOT EXISTS session_default PARTITION OF session DEFAULT"
+                ))
+        except DBAPIError as e:
+            logger.warning("Creating session partition session_default failed: %s", e)
+
+    created = []
+    today = date.today()
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        name = _partition_name(day)
+        if name in existing:
+            continue
+        try:
+            # Savepoint, so a failure leaves the surrounding transaction usable
+            async with conn.begin_nested():
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF session "
+                    f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+                ))
+        except DBAPIError as e:
+            logger.warning("Creating session partition %s failed: %s", name, e)
+            continue
+        created.append(name)
+    return created
+
+
+async def _has_default_partition(conn: AsyncConnection) -> bool:
+    result = await conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table t "
+        "JOIN pg_class p ON p.oid = t.partrelid "
+        "WHERE p.relname = 'session' AND t.partdefid <> 0"
+    ))
+    return result.scalar_one_or_none() is not None
+
+
+async def _detach_partition(engine: AsyncEngine, name: str, concurrently: bool) -> None:
+    """
+    Detach a partition from session without holding up the lookups on it.
+    DETACH ... CONCURRENTLY only takes a SHARE UPDATE EXCLUSIVE lock but
+    can't run in a transaction and Postgres refuses it while a default
+    partition exists. A plain DETACH needs an ACCESS EXCLUSIVE lock, so it
+    gives up after SESSION_PARTITION_LOCK_TIMEOUT_MS instead of queueing
+    every session lookup behind it.
+    """
+    if concurrently:
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            try:
+                await conn.execute(text(f"ALTER TABLE session DETACH PARTITION {name} CONCURRENTLY"))
+            except DBAPIError:
+                # An interrupted earlier run leaves the detach pending
+                await conn.execute(text(f"ALTER TABLE session DETACH PARTITION {name} FINALIZE"))
+        return
+
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            f"SET LOCAL lock_timeout = {int(database_settings.SESSION_PARTITION_LOCK_TIMEOUT_MS)}"
+        ))
+        await conn.execute(text(f"ALTER TABLE session DETACH PARTITION {name}"))
+
+
+async def drop_expired_session_partitions(engine: AsyncEngine) -> list[str]:
+    """
+    Detach and drop daily partitions older than the retention period, one
+    transaction each. On a table that is not partitioned (yet) the expired
+    rows are deleted instead.
+    """
+    cutoff = date.today() - timedelta(days=database_settings.SESSION_RETENTION_DAYS)
+    cutoff_at = datetime.combine(cutoff, datetime.min.time())
+
+    async with engine.begin() as conn:
+        if not await _is_partitioned(conn):
+            await conn.execute(text("DELETE FROM session WHERE expering_at < :cutoff"), {"cutoff": cutoff_at})
+            return []
+        names = await _partition_names(conn)
+        has_default = await _has_default_partition(conn)
+        # Rows that landed in the default partition are cleaned up row by row
+        if has_default:
+            await conn.execute(
+                text("DELETE FROM session_default WHERE expering_at < :cutoff"),
+                {"cutoff": cutoff_at},
+            )
+
+    dropped = []
+    for name in names:
+        if not name.startswith(_PARTITION_PREFIX):
+            continue
+        try:
+            day = datetime.strptime(name[len(_PARTITION_PREFIX):], "%Y%m%d").date()
+        except ValueError:
+            continue
+        # The partition holds [day, day + 1)
+        if day + timedelta(days=1) > cutoff:
+            continue
+        try:
+            await _detach_partition(engine, name, concurrently=not has_default)
+            # Detached, dropping it no longer locks session
+            async with engine.begin() as conn:
+                await conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        except DBAPIError as e:
+            logger.warning("Dropping session partition %s failed, retrying next run: %s", name, e)
+            continue
+        dropped.append(name)
+    return dropped
@@ -1,15 +1,56 @@
-from fastapi import FastAPI, Depends
+import logging
+
+from fastapi import FastAPI, Depends, Response
 from sqlmodel.ext.asyncio.session import AsyncSession
-from app.database.database import create_db_and_tables, get_session
+from app.database.database import create_db_and_tables, engine, get_session, replica_engine, replica_monitor
 from app.database.models import User
 from contextlib import asynccontextmanager
 from scalar_fastapi import get_scalar_api_reference
 from app.api.router import master_router
+from app.config import app_settings, database_settings, ivion_settings
+from app.core.http import IvionHttpClients
+from app.core.invalidation import invalidation_listener
+from app.core.logs import setup_logging, shutdown_logging
+from app.core.metrics import MetricsMiddleware, render_metrics
+from app.core.tracing import TracingMiddleware, instrument_engine, tracer
+from app.core.scheduler import poi_syncer, session_retention, token_refresher
+from app.database.redis import shared_cache
+from app.utils import crypto_pool
+
+setup_logging()
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan_handler(app: FastAPI):
     await create_db_and_tables()
+    app.state.http_clients = IvionHttpClients.from_settings()
+    if database_settings.SESSION_RETENTION_ENABLED:
+        try:
+            await session_retention.run_once()
+        except Exception:
+            # Today's partitions exist already, the job retries on its interval
+            logger.exception("Initial session retention run failed")
+        session_retention.start(app.state.http_clients)
+    if ivion_settings.TOKEN_REFRESH_ENABLED:
+        token_refresher.start(app.state.http_clients)
+    if ivion_settings.POI_SYNC_ENABLED:
+        poi_syncer.start(app.state.http_clients)
+    if database_settings.CACHE_INVALIDATION_ENABLED:
+        invalidation_listener.start()
+    replica_monitor.start()
     yield
+    await replica_monitor.stop()
+    await invalidation_listener.stop()
+    await session_retention.stop()
+    await poi_syncer.stop()
+    await token_refresher.stop()
+    await app.state.http_clients.aclose()
+    await shared_cache.aclose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+    crypto_pool.shutdown()
+    tracer.shutdown()
+    shutdown_logging()
 
 app = FastAPI(
     lifespan=lifespan_handler,
@@ -17,6 +58,21 @@ app = FastAPI(
 
 app.include_router(master_router)
 
+if app_settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    def get_metrics():
+        content, media_type = render_metrics()
+        return Response(content=content, media_type=media_type)
+
+if app_settings.TRACING_ENABLED:
+    instrument_engine(engine)
+    if replica_engine is not None:
+        instrument_engine(replica_engine)
+    # Added last so it wraps everything, metrics included
+    app.add_middleware(TracingMiddleware)
+
 @app.get("/scalar", include_in_schema=False)
 def get_scalar_docs():
     return get_scalar_api_reference(
@@ -0,0 +1,240 @@
+import asyncio
+import csv
+import io
+from datetime import datetime
+from uuid import uuid4
+
+import orjson
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.schemas.user import BulkImportRead, BulkRowResult, SiteCreate, UserCreate
+from app.config import app_settings
+from app.core.credential_cache import credential_cache
+from app.core.invalidation import publish_invalidation
+from app.database.models import Site, User, UserSiteLink
+from app.utils import crypto_pool, hash_password
+
+
+def parse_rows(content: bytes, content_type: str | None) -> list[dict]:
+    """
+    Rows of a bulk import from a JSON array or a CSV file with a header line.
+    In CSV the site_ids column holds ids separated by ";".
+    """
+    if content_type and "csv" in content_type:
+        reader = csv.DictReader(io.StringIO(content.decode("utf-8-sig")))
+        rows = []
+        for row in reader:
+            if "site_ids" in row:
+                row["site_ids"] = [
+                    site_id.strip()
+                    for site_id in (row["site_ids"] or "").split(";")
+                    if site_id.strip()
+                ]
+            rows.append(row)
+    else:
+        try:
+            rows = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Body must be a JSON array or a CSV file",
+            )
+        if not isinstance(rows, list):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Body must be a JSON array or a CSV file",
+            )
+
+    if len(rows) > app_settings.BULK_IMPORT_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {app_settings.BULK_IMPORT_MAX_ROWS} rows per import",
+        )
+    return rows
+
+
+def _validation_error(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+        for error in e.errors()
+    )
+
+
+class BulkImportService:
+    """
+    Imports users and sites in bulk. Rows are validated up front, passwords
+    are hashed in parallel and every write is a multi-row INSERT ... RETURNING
+    committed in a single transaction. Invalid rows are reported and skipped.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.batch_size = app_settings.BULK_INSERT_BATCH_SIZE
+
+    def _validate(self, rows: list, schema: type[BaseModel]) -> tuple[dict, dict]:
+        """Split rows into {row: model} and {row: BulkRowResult} for the failures"""
+        valid, failed = {}, {}
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                failed[index] = BulkRowResult(row=index, error="Row must be an object")
+                continue
+            try:
+                valid[index] = schema.model_validate(row)
+            except ValidationError as e:
+                failed[index] = BulkRowResult(row=index, error=_validation_error(e))
+        return valid, failed
+
+    async def _hash_passwords(self, passwords: list[str]) -> list[str]:
+        # Bounded by the pool's worker count so an import never fills the
+        # crypto queue and starves signups and logins running alongside it
+        limit = asyncio.Semaphore(crypto_pool.max_workers)
+
+        async def _hash(password: str) -> str:
+            async with limit:
+                return await hash_password(password[:72])
+
+        return await asyncio.gather(*(_hash(password) for password in passwords))
+
+    async def _insert_returning(self, model, rows: list[dict], columns, conflict: list[str] | None = None):
+        returned = []
+        for start in range(0, len(rows), self.batch_size):
+            stmt = insert(model).values(rows[start:start + self.batch_size])
+            if conflict:
+                stmt = stmt.on_conflict_do_nothing(index_elements=conflict)
+            result = await self.session.execute(stmt.returning(*columns))
+            returned.extend(result.all())
+        return returned
+
+    def _report(self, total: int, results: dict[int, BulkRowResult]) -> BulkImportRead:
+        rows = [results[index] for index in range(total)]
+        failed = sum(1 for row in rows if row.error is not None)
+        return BulkImportRead(created=total - failed, failed=failed, rows=rows)
+
+    async def import_users(self, rows: list) -> BulkImportRead:
+        valid, results = self._validate(rows, UserCreate)
+
+        # Only the first occurrence of a username in the file is imported
+        seen = {}
+        for index, user in list(valid.items()):
+            if user.username in seen:
+                results[index] = BulkRowResult(
+                    row=index,
+                    error=f"Duplicate username in import (row {seen[user.username]})",
+                )
+                del valid[index]
+            else:
+                seen[user.username] = index
+
+        indexes = list(valid)
+        hashes = await self._hash_passwords([valid[index].password for index in indexes])
+
+        now = datetime.now()
+        user_rows = []
+        for index, password_hash in zip(indexes, hashes):
+            user = valid[index]
+            user_rows.append({
+                "id": uuid4(),
+                "created_at": now,
+                "username": user.username,
+                "ivion_username": user.ivion_username,
+                "ivion_password": user.ivion_password,
+                "hashed_password": password_hash,
+            })
+
+        try:
+            # Usernames already in the database come back without a row
+            inserted = await self._insert_returning(
+                User,
+                user_rows,
+                (User.id, User.username),
+                conflict=["username"],
+            )
+            user_ids = {username: user_id for user_id, username in inserted}
+
+            requested_site_ids = {
+                site_id for index in indexes for site_id in valid[index].site_ids
+            }
+            existing_site_ids = set()
+            if requested_site_ids:
+                result = await self.session.execute(
+                    select(Site.id).where(Site.id.in_(requested_site_ids))
+                )
+                existing_site_ids = set(result.scalars().all())
+
+            link_rows = []
+            for index in indexes:
+                user = valid[index]
+                user_id = user_ids.get(user.username)
+                if user_id is None:
+                    results[index] = BulkRowResult(row=index, error="Username already exists")
+                    continue
+                site_ids = list(dict.fromkeys(user.site_ids))
+                link_rows.extend(
+                    {"user_id": user_id, "site_id": site_id}
+                    for site_id in site_ids
+                    if site_id in existing_site_ids
+                )
+                results[index] = BulkRowResult(
+                    row=index,
+                    id=user_id,
+                    missing_site_ids=[
+                        site_id for site_id in site_ids if site_id not in existing_site_ids
+                    ],
+                )
+
+            if link_rows:
+                await self._insert_returning(
+                    UserSiteLink,
+                    link_rows,
+                    (UserSiteLink.user_id,),
+                    conflict=["user_id", "site_id"],
+                )
+            if user_ids:
+                # One event for the whole import, every worker clears its cache
+                await publish_invalidation(self.session, "bulk")
+            await self.session.commit()
+        except Exception:
+            await self.session.rollback()
+            raise
+
+        for username, user_id in user_ids.items():
+            credential_cache.invalidate_user(user_id, username)
+        for site_id in {row["site_id"] for row in link_rows}:
+            credential_cache.invalidate_site(site_id)
+
+        return self._report(len(rows), results)
+
+    async def import_sites(self, rows: list) -> BulkImportRead:
+        valid, results = self._validate(rows, SiteCreate)
+
+        indexes = list(valid)
+        now = datetime.now()
+        site_rows = [
+            {
+                "id": uuid4(),
+                "created_at": now,
+                "name": valid[index].name,
+                "instance_url": valid[index].instance_url,
+                "ivion_id": valid[index].ivion_id,
+            }
+            for index in indexes
+        ]
+
+        try:
+            inserted = await self._insert_returning(Site, site_rows, (Site.id,))
+            await self.session.commit()
+        except Exception:
+            await self.session.rollback()
+            raise
+
+        inserted_ids = {site_id for site_id, in inserted}
+        for index, site_row in zip(indexes, site_rows):
+            if site_row["id"] in inserted_ids:
+                results[index] = BulkRowResult(row=index, id=site_row["id"])
+            else:
+                results[index] = BulkRowResult(row=index, error="Site was not inserted")
+        return self._report(len(rows), results)
@@ -1,31 +1,305 @@
+import asyncio
+import logging
 from datetime import datetime, timedelta
-from typing import List
+from typing import Awaitable, Callable, List
 from uuid import UUID
 import uuid
 import httpx
-from sqlalchemy import insert, select
+import orjson
+from sqlalchemy import insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import BackgroundTasks, HTTPException, status
-from app.api.schemas.user import GetToken, SiteUser, UserCreate
+from fastapi import BackgroundTasks, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from app.api.schemas.user import BatchOperation, GetToken, PoiQuery, SiteUser, UserCreate
+from app.core.circuit_breaker import UpstreamUnavailable
+from app.core.credential_cache import credential_cache
+from app.core.http import IvionHttpClients
+from app.core.metrics import SESSION_INSERTS, upstream_timer
+from app.core.tracing import trace_methods
+from app.core.poi_query import apply_query
+from app.core.retry import upstream_retry
+from app.core.response_cache import get_shared_response, response_cache, set_shared_response
+from app.core.scheduler import token_refresher
+from app.core.singleflight import login_flights
+from app.database.database import async_session_factory
 from app.database.models import Session, Site, User, UserSiteLink
-from passlib.context import CryptContext
+from app.database.redis import shared_cache
 from app.api.schemas.user import UserCreate
-from app.utils import generate_access_token, generate_url_safe_token
-
-password_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto",
+from app.config import ivion_settings
+from app.core.token_cache import (
+    delete_shared_session,
+    get_shared_session,
+    set_shared_session,
+    token_cache,
+    token_cache_key,
 )
+from app.utils import decode_token_expiry
+
+logger = logging.getLogger(__name__)
+
+# IVION rejects revoked or otherwise invalid access tokens with these
+_TOKEN_REJECTED_STATUSES = {status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN}
+
+
+async def store_session(
+    session: AsyncSession,
+    site_user: SiteUser,
+    data: dict,
+    source: str,
+) -> dict:
+    """
+    Persist an upstream token payload as a session row. Rows are reused
+    until `expering_at`, so it comes from the access token itself and is
+    only 1h when the token can't be read.
+    """
+    now = datetime.now()
+    expering_at = None
+    if data.get("access_token"):
+        expering_at = decode_token_expiry(data["access_token"])
+    session_obj = Session(
+        id=uuid.uuid4(),
+        created_at=now,
+        expering_at=expering_at or now + timedelta(hours=1),
+        user_id=site_user.user_id,    # ensure SiteUser has this
+        site_id=site_user.site_id,    # ensure SiteUser has this
+        data=data,  # e.g., store tokens, user info — use dict, not str
+    )
+
+    session.add(session_obj)
+    await session.commit()
+    await session.refresh(session_obj)  # get DB-generated fields if any
+    SESSION_INSERTS.labels(source).inc()
+
+    return session_obj.model_dump()
 
+
+@trace_methods
 class OpenpackService:
-    def __init__(self, session: AsyncSession, model=User):
+    def __init__(
+        self,
+        session: AsyncSession,
+        http_clients: IvionHttpClients,
+        model=User,
+        read_session: AsyncSession | None = None,
+    ):
         self.model = model
         self.session = session
+        # Replica session for lookups that tolerate lag, sessions stay on the primary
+        self.read_session = read_session or session
+        self.http_clients = http_clients
+        # Per-request memo of the resolved credentials
+        self._site_user: SiteUser | None = None
     
     async def _get_user(self) -> User | None:
         stmt = select(self.model).where(self.model.username == "dfre")
-        result = await self.session.execute(stmt)
+        result = await self.read_session.execute(stmt)
         return result.scalar_one_or_none()
+
+    async def _get_site_user(self) -> SiteUser:
+        """
+        Credentials for the upstream calls, memoized for the request and
+        cached for the process so hot requests skip the user lookup.
+        """
+        if self._site_user is not None:
+            return self._site_user
+
+        key = ("user", "dfre", "1a2cfa81-9677-4b3f-9395-338ab0e9aef0")
+        site_user = credential_cache.get(key)
+        if site_user is None:
+            user = await self._get_user()
+            if user is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User not found",
+                )
+            site_user = SiteUser(
+                site_id="1a2cfa81-9677-4b3f-9395-338ab0e9aef0",
+                user_id=user.id,
+                ivion_id="112233",
+                instance_url=ivion_settings.IVION_INSTANCE_URL,
+                ivion_username=user.ivion_username,
+                ivion_password=user.ivion_password
+            )
+            credential_cache.set(key, site_user)
+
+        self._site_user = site_user
+        return site_user
+
+    async def _get_stored_session(
+        self,
+        site_user: SiteUser,
+        valid_only: bool = True,
+    ) -> dict | None:
+        """Newest session row for the user/site, by default only if still valid"""
+        stmt = select(Session).where(
+            Session.user_id == site_user.user_id,
+            Session.site_id == site_user.site_id,
+        )
+        if valid_only:
+            valid_after = datetime.now() + timedelta(
+                seconds=ivion_settings.TOKEN_EXPIRY_MARGIN_SECONDS
+            )
+            stmt = stmt.where(Session.expering_at > valid_after)
+        stmt = stmt.order_by(Session.created_at.desc()).limit(1)
+        result = await self.session.execute(stmt)
+        session_obj = result.scalar_one_or_none()
+        return session_obj.model_dump() if session_obj else None
+
+    async def _get_session(self, site_user: SiteUser) -> dict:
+        """
+        Return a valid IVION session, trying the in-memory cache first,
+        then the session table and only then logging in upstream.
+
+        Concurrent misses for the same key share a single lookup/login.
+        """
+        key = token_cache_key(site_user)
+        token_refresher.track(site_user)
+
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        return await login_flights.do(key, lambda: self._in_own_session(
+            lambda service: service._load_session(site_user)
+        ))
+
+    async def _in_own_session(self, fn: Callable[["OpenpackService"], Awaitable[dict]]) -> dict:
+        """
+        Run a shared flight on a service with its own db session. Requests
+        other than the one that started the flight await its result, so it
+        must not use, or die with, that request's session.
+        """
+        async with async_session_factory() as session:
+            return await fn(OpenpackService(session, self.http_clients))
+
+    async def _load_session(self, site_user: SiteUser) -> dict:
+        key = token_cache_key(site_user)
+
+        # Session another worker already has, shared through Redis
+        session_data = await get_shared_session(key)
+        if session_data is None:
+            session_data = await self._get_stored_session(site_user)
+            if session_data is None:
+                return await self._renew_session(site_user)
+            await set_shared_session(key, session_data)
+
+        token_cache.set(key, session_data)
+        return session_data
+
+    async def renew_session(self, site_user: SiteUser) -> dict:
+        """Renew the session ahead of expiry (used by the background refresher)"""
+        key = token_cache_key(site_user)
+        return await login_flights.do(key, lambda: self._in_own_session(
+            lambda service: service._renew_session(site_user)
+        ))
+
+    async def _renew_session(self, site_user: SiteUser) -> dict:
+        key = token_cache_key(site_user)
+
+        # Renew with the refresh token of the last known session
+        session_data = None
+        previous = token_cache.peek(key) or await self._get_stored_session(
+            site_user, valid_only=False
+        )
+
+        # Only one worker in the cluster logs in per account at a time
+        async with shared_cache.lock("login:" + "|".join(key)):
+            # Another worker may have renewed it while this one waited
+            shared = await get_shared_session(key)
+            if shared is not None and (
+                previous is None or shared["created_at"] > previous["created_at"]
+            ):
+                token_cache.set(key, shared)
+                return shared
+
+            if previous is not None:
+                session_data = await self._refresh_session(site_user, previous)
+            if session_data is None:
+                session_data = await self._generate_session(site_user)
+
+            token_cache.set(key, session_data)
+            await set_shared_session(key, session_data)
+        return session_data
+
+    async def _replace_rejected_session(self, site_user: SiteUser, rejected_token: str) -> str:
+        """
+        Forget a session whose access token IVION rejected and return the
+        access token of a renewed one. The session is dropped from the
+        memory cache and Redis and its session row is expired, so it is
+        not served again. Requests that hit the rejection together share
+        a single renewal.
+        """
+        key = token_cache_key(site_user)
+        session_data = await login_flights.do(key, lambda: self._in_own_session(
+            lambda service: service._replace_session(site_user, rejected_token)
+        ))
+        return session_data.get("data", {}).get("access_token")
+
+    async def _replace_session(self, site_user: SiteUser, rejected_token: str) -> dict:
+        key = token_cache_key(site_user)
+        current = token_cache.get(key)
+        if current is not None and current["data"].get("access_token") != rejected_token:
+            # Already replaced by a request that was rejected first
+            return current
+        token_cache.invalidate(key)
+        shared = await get_shared_session(key)
+        if shared is not None and shared["data"].get("access_token") == rejected_token:
+            await delete_shared_session(key)
+        await self.session.execute(
+            update(Session)
+            .where(
+                Session.user_id == site_user.user_id,
+                Session.site_id == site_user.site_id,
+                Session.data["access_token"].astext == rejected_token,
+            )
+            .values(expering_at=datetime.now())
+        )
+        await self.session.commit()
+        logger.warning(
+            "IVION rejected a cached access token, renewing the session",
+            extra={"user_id": str(site_user.user_id), "site_id": str(site_user.site_id)},
+        )
+        return await self._renew_session(site_user)
+
+    async def _store_session(self, site_user: SiteUser, data: dict, source: str) -> dict:
+        return await store_session(self.session, site_user, data, source)
+
+    async def _refresh_session(self, site_user: SiteUser, previous: dict) -> dict | None:
+        """
+        Renew the access token with the stored refresh token.
+
+        Returns None when there is no refresh token or IVION rejects it,
+        so the caller can fall back to a credential login.
+        """
+        previous_data = previous.get("data") or {}
+        refresh_token = previous_data.get("refresh_token")
+        if not refresh_token:
+            return None
+
+        try:
+            client = self.http_clients.get(site_user.instance_url)
+            with upstream_timer("refresh") as timer:
+                response = await client.post(
+                    url=site_user.instance_url + ivion_settings.REFRESH_TOKEN_PATH,
+                    json={"refresh_token": refresh_token},
+                    headers={"Content-Type": "application/json"},
+                )
+                timer.status = response.status_code
+            response.raise_for_status()
+            refreshed = response.json()
+        except (httpx.HTTPError, ValueError):
+            return None
+
+        if not isinstance(refreshed, dict) or not refreshed.get("access_token"):
+            return None
+
+        # Keep principal/refresh token from the previous session unless renewed
+        try:
+            return await self._store_session(site_user, {**previous_data, **refreshed}, source="refresh")
+        except Exception:
+            await self.session.rollback()
+            return None
     
     async def _generate_session(
         self,
@@ -41,14 +315,15 @@ class OpenpackService:
         headers = {"Content-Type": "application/json"}
 
         try:
-            async with httpx.AsyncClient() as client:
+            client = self.http_clients.get(site_user.instance_url)
+            with upstream_timer("login") as timer:
                 response = await client.post(
                     url=site_user.instance_url + "/api/auth/generate_tokens",
                     json=payload,
                     headers=headers,
-                    timeout=10.0
                 )
-                response.raise_for_status()
+                timer.status = response.status_code
+            response.raise_for_status()
 
             # Parse response
             content_type = response.headers.get("content-type", "").lower()
@@ -60,23 +335,10 @@ class OpenpackService:
             }
 
             # ✅ Create and persist local session
-            now = datetime.now()
-            session_obj = Session(
-                id=uuid.uuid4(),
-                created_at=now,
-                expering_at=now + timedelta(hours=1),  # or parse expiry from response if available
-                user_id=site_user.user_id,    # ensure SiteUser has this
-                site_id=site_user.site_id,    # ensure SiteUser has this
-                data=response_data["json"] or {},  # e.g., store tokens, user info — use dict, not str
-            )
-
-            self.session.add(session_obj)
-            await self.session.commit()
-            await self.session.refresh(session_obj)  # get DB-generated fields if any
-
-            # ✅ Return enriched response
-            return session_obj.__dict__
+            return await self._store_session(site_user, response_data["json"] or {}, source="login")
 
+        except UpstreamUnavailable:
+            raise
         except httpx.HTTPStatusError as e:
             raise HTTPException(
                 status_code=e.response.status_code,
@@ -94,37 +356,36 @@ class OpenpackService:
                 detail=f"Failed to create session: {str(e)}"
             )
 
-    async def _get_Site(
+    async def _upstream_get(
         self,
-        site_user: SiteUser,  # must have .user_id (UUID) and .site_id (UUID)
-        jwt_token: str,  # JWT token for authorization
-    ) -> dict:
-        print("recieved token: ", jwt_token)
+        site_user: SiteUser,
+        jwt_token: str,
+        url: str,
+        operation: str = "get",
+    ) -> httpx.Response:
         headers = {
             "Content-Type": "application/json",
             "X-Authorization": f"Bearer {jwt_token}"
         }
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url="https://factory360core.iv.navvis.com/api/sites",
-                    headers=headers,
-                    timeout=10.0
+            client = self.http_clients.get(site_user.instance_url)
+            response = await upstream_retry.run(
+                operation, lambda: self._send_get(client, url, headers, operation)
+            )
+            if response.status_code in _TOKEN_REJECTED_STATUSES:
+                # The cached token was revoked upstream, retry once with a new one
+                jwt_token = await self._replace_rejected_session(site_user, jwt_token)
+                retry_headers = {**headers, "X-Authorization": f"Bearer {jwt_token}"}
+                response = await upstream_retry.run(
+                    operation, lambda: self._send_get(client, url, retry_headers, operation)
                 )
-                response.raise_for_status()
-
-            # Parse response
-            content_type = response.headers.get("content-type", "").lower()
-            response_data = {
-                "status_code": response.status_code,
-                "headers": dict(response.headers),
-                "json": response.json() if "application/json" in content_type else None,
-                "text": response.text if "application/json" not in content_type else None
-            }
-
-            return response_data
+            response.raise_for_status()
+            return response
 
+        except HTTPException:
+            # Circuit open, or the session could not be renewed
+            raise
         except httpx.HTTPStatusError as e:
             raise HTTPException(
                 status_code=e.response.status_code,
@@ -136,121 +397,177 @@ class OpenpackService:
                 detail=f"Network error contacting auth API: {str(e)}"
             )
         except Exception as e:
-            await self.session.rollback()
+            # No rollback: nothing here writes, and batch() runs many of
+            # these at once on the request's session
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to create session: {str(e)}"
             )
-    
+
+    async def _send_get(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: dict,
+        operation: str,
+    ) -> httpx.Response:
+        """One attempt of an upstream GET, retried and hedged by _upstream_get"""
+        with upstream_timer(operation) as timer:
+            response = await client.get(
+                url=url,
+                headers=headers,
+            )
+            timer.status = response.status_code
+        return response
+
+    def _response_payload(self, response: httpx.Response) -> dict | Response:
+        content_type = response.headers.get("content-type", "").lower()
+
+        if ivion_settings.RESPONSE_PASSTHROUGH:
+            # Forward the upstream bytes as-is, no parse/serialize round trip
+            return Response(
+                content=response.content,
+                status_code=response.status_code,
+                media_type=content_type or "application/json",
+            )
+
+        return {
+            "status_code": response.status_code,
+            "headers": dict(response.headers),
+            "json": response.json() if "application/json" in content_type else None,
+            "text": response.text if "application/json" not in content_type else None
+        }
+
+    def _json_payload(self, data) -> dict | Response:
+        """Shape locally produced JSON like an upstream response"""
+        if ivion_settings.RESPONSE_PASSTHROUGH:
+            return Response(content=orjson.dumps(data), media_type="application/json")
+
+        return {
+            "status_code": status.HTTP_200_OK,
+            "headers": {},
+            "json": data,
+            "text": None
+        }
+
+    async def _get_Site(
+        self,
+        site_user: SiteUser,  # must have .user_id (UUID) and .site_id (UUID)
+        jwt_token: str,  # JWT token for authorization
+    ) -> dict | Response:
+        response = await self._upstream_get(
+            site_user,
+            jwt_token,
+            site_user.instance_url + "/api/sites",
+            operation="sites",
+        )
+        return self._response_payload(response)
+
     async def _get_Site_info(
         self,
         site_user: SiteUser,  # must have .user_id (UUID) and .site_id (UUID)
         jwt_token: str,  # JWT token for authorization
         siteId: str
-    ) -> dict:
-        print("recieved token: ", jwt_token)
-        headers = {
-            "Content-Type": "application/json",
-            "X-Authorization": f"Bearer {jwt_token}"
-        }
-        print("req link", "https://factory360core.iv.navvis.com/api/sites/"+siteId)
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url="https://factory360core.iv.navvis.com/api/sites/"+siteId,
-                    headers=headers,
-                    timeout=10.0
-                )
-                response.raise_for_status()
-
-            # Parse response
-            content_type = response.headers.get("content-type", "").lower()
-            response_data = {
-                "status_code": response.status_code,
-                "headers": dict(response.headers),
-                "json": response.json() if "application/json" in content_type else None,
-                "text": response.text if "application/json" not in content_type else None
-            }
-
-            return response_data
+    ) -> dict | Response:
+        response = await self._upstream_get(
+            site_user,
+            jwt_token,
+            site_user.instance_url + "/api/sites/" + siteId,
+            operation="siteInfo",
+        )
+        return self._response_payload(response)
 
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=e.response.status_code,
-                detail=f"External auth failed: {e.response.text[:200]}"
-            )
-        except httpx.RequestError as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Network error contacting auth API: {str(e)}"
-            )
-        except Exception as e:
-            await self.session.rollback()
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to create session: {str(e)}"
-            )
     async def _get_SitePois(
         self,
         site_id: str,
         site_user: SiteUser,  # must have .user_id (UUID) and .site_id (UUID)
         jwt_token: str,  # JWT token for authorization
-    ) -> dict:
-        print("recieved token: ", jwt_token)
+    ) -> dict | Response:
+        response = await self._upstream_get(
+            site_user,
+            jwt_token,
+            site_user.instance_url + "/api/site/" + site_id + "/pois",
+            operation="sitePois",
+        )
+        return self._response_payload(response)
+
+    async def _stream_SitePois(
+        self,
+        site_id: str,
+        site_user: SiteUser,  # must have .user_id (UUID) and .site_id (UUID)
+        jwt_token: str,  # JWT token for authorization
+    ) -> StreamingResponse:
+        """
+        Proxy the upstream POI list chunk by chunk. Chunks are only read
+        from upstream as the client consumes them, so memory per request
+        stays at roughly one chunk regardless of the site size.
+        """
         headers = {
             "Content-Type": "application/json",
             "X-Authorization": f"Bearer {jwt_token}"
         }
+        max_bytes = ivion_settings.STREAM_MAX_BYTES
 
+        client = self.http_clients.get(site_user.instance_url)
+        url = site_user.instance_url + "/api/site/" + site_id + "/pois"
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url="https://factory360core.iv.navvis.com/api/site/"+site_id+"/pois",
-                    headers=headers,
-                    timeout=10.0
-                )
-                response.raise_for_status()
-
-            # Parse response
-            content_type = response.headers.get("content-type", "").lower()
-            response_data = {
-                "status_code": response.status_code,
-                "headers": dict(response.headers),
-                "json": response.json() if "application/json" in content_type else None,
-                "text": response.text if "application/json" not in content_type else None
-            }
-
-            return response_data
-
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=e.response.status_code,
-                detail=f"External auth failed: {e.response.text[:200]}"
-            )
+            # Measures the time to the response headers, not the whole body
+            with upstream_timer("sitePoisStream") as timer:
+                response = await client.send(client.build_request("GET", url, headers=headers), stream=True)
+                timer.status = response.status_code
+            if response.status_code in _TOKEN_REJECTED_STATUSES:
+                await response.aclose()
+                jwt_token = await self._replace_rejected_session(site_user, jwt_token)
+                headers = {**headers, "X-Authorization": f"Bearer {jwt_token}"}
+                with upstream_timer("sitePoisStream") as timer:
+                    response = await client.send(client.build_request("GET", url, headers=headers), stream=True)
+                    timer.status = response.status_code
         except httpx.RequestError as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"Network error contacting auth API: {str(e)}"
             )
-        except Exception as e:
-            await self.session.rollback()
+
+        if response.is_error:
+            await response.aread()
+            await response.aclose()
             raise HTTPException(
-                status_code=500,
-                detail=f"Failed to create session: {str(e)}"
+                status_code=response.status_code,
+                detail=f"External auth failed: {response.text[:200]}"
             )
 
-    async def get_sites(self) -> dict | None:
-        user = await self._get_user()
-
-        site_user = SiteUser(
-            site_id="1a2cfa81-9677-4b3f-9395-338ab0e9aef0",
-            user_id=user.id,
-            ivion_id="112233",
-            instance_url="https://factory360core.iv.navvis.com",
-            ivion_username=user.ivion_username,
-            ivion_password=user.ivion_password
+        content_length = response.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            await response.aclose()
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Upstream POI payload exceeds {max_bytes} bytes",
+            )
+
+        async def body():
+            received = 0
+            try:
+                async for chunk in response.aiter_bytes(ivion_settings.STREAM_CHUNK_SIZE):
+                    received += len(chunk)
+                    if received > max_bytes:
+                        # Headers are already sent, all we can do is abort
+                        raise RuntimeError(f"Upstream POI payload exceeds {max_bytes} bytes")
+                    yield chunk
+            finally:
+                await response.aclose()
+
+        return StreamingResponse(
+            body(),
+            status_code=response.status_code,
+            media_type=response.headers.get("content-type", "application/json"),
+            # The generator's finally only runs if it was started and then
+            # finished or closed; this also covers a client that left first
+            background=BackgroundTask(response.aclose),
         )
-        newsession = await self._generate_session(site_user)
+
+    async def get_sites(self) -> dict | None:
+        site_user = await self._get_site_user()
+        newsession = await self._get_session(site_user)
         data = newsession.get("data", {})
         principal = data.get("principal", {})
         sites = principal.get("site_default_group_read", {})
@@ -258,71 +575,231 @@ class OpenpackService:
         return {"sites": external_site_ids} 
 
     async def get_token(self) -> GetToken:
-        user = await self._get_user()
-        site_user = SiteUser(
-            site_id="1a2cfa81-9677-4b3f-9395-338ab0e9aef0",
-            user_id=user.id,
-            ivion_id="112233",
-            instance_url="https://factory360core.iv.navvis.com",
-            ivion_username=user.ivion_username,
-            ivion_password=user.ivion_password
-        )
-        newsession = await self._generate_session(site_user)
+        site_user = await self._get_site_user()
+        newsession = await self._get_session(site_user)
         data = newsession.get("data", {})
         access_token = data.get("access_token", {})
         refresh_token = data.get("refresh_token", {})
 
         return  {"access_token": access_token, "refresh_token": refresh_token}
     
-    async def get_SiteInfo(self, siteId) -> dict | None:
-        user = await self._get_user()
-        site_user = SiteUser(
-            site_id="1a2cfa81-9677-4b3f-9395-338ab0e9aef0",
-            user_id=user.id,
-            ivion_id="112233",
-            instance_url="https://factory360core.iv.navvis.com",
-            ivion_username=user.ivion_username,
-            ivion_password=user.ivion_password
-        )
+    async def _cached(self, endpoint: str, siteId: str) -> dict | Response | None:
+        """
+        Serve siteInfo/sitePois from the response cache, fetching upstream
+        on a miss and revalidating in the background when stale.
+        """
+        if not ivion_settings.RESPONSE_CACHE_ENABLED:
+            return await self._fetch(endpoint, siteId)
+
+        hit = response_cache.get(endpoint, siteId)
+        if hit is None:
+            # Another worker may have fetched it already
+            shared = await get_shared_response(endpoint, siteId)
+            if shared is not None:
+                value, age = shared
+                response_cache.set(endpoint, siteId, value, age=age)
+                hit = response_cache.get(endpoint, siteId)
+        if hit is not None:
+            value, fresh = hit
+            if not fresh:
+                response_cache.revalidate(
+                    endpoint, siteId, lambda: self._revalidate(endpoint, siteId)
+                )
+            return value
+
+        try:
+            value = await self._fetch(endpoint, siteId)
+        except UpstreamUnavailable:
+            # Outdated data beats an error while IVION is down
+            value = response_cache.fallback(
+                endpoint, siteId, ivion_settings.CIRCUIT_STALE_MAX_AGE_SECONDS
+            )
+            if value is None:
+                raise
+            return value
+        response_cache.set(endpoint, siteId, value)
+        await set_shared_response(endpoint, siteId, value)
+        return value
+
+    async def _fetch(self, endpoint: str, siteId: str) -> dict | Response | None:
+        if endpoint == "siteInfo":
+            return await self._fetch_SiteInfo(siteId)
+        if endpoint == "sitePois":
+            return await self._fetch_SitePois(siteId)
+        if endpoint == "siteInfoData":
+            return await self.get_SiteInfo_data(siteId)
+        if endpoint == "sitePoisData":
+            return await self.get_SitePois_data(siteId)
+        raise ValueError(f"Unknown endpoint {endpoint}")
+
+    async def _revalidate(self, endpoint: str, siteId: str) -> dict | Response | None:
+        # Runs after the request finished, so it needs its own db session
+        async with async_session_factory() as session:
+            service = OpenpackService(session, self.http_clients)
+            value = await service._fetch(endpoint, siteId)
+        await set_shared_response(endpoint, siteId, value)
+        return value
+
+    async def get_SiteInfo(self, siteId) -> dict | Response | None:
+        return await self._cached("siteInfo", siteId)
+
+    async def _fetch_SiteInfo(self, siteId) -> dict | Response | None:
+        site_user = await self._get_site_user()
         token = await self.get_token()
-        print("🔧 [DEBUG] token: ", token)
         Sites = await self._get_Site_info(site_user=site_user, jwt_token=token.get("access_token"), siteId=siteId)
-
-        print("🔧 [DEBUG] sites: ", Sites)
+        logger.debug("Fetched site info", extra={"site_id": siteId})
         return  Sites
     
-    async def get_SitePois(self, siteId) -> dict | None:
-        user = await self._get_user()
-        site_user = SiteUser(
-            site_id="1a2cfa81-9677-4b3f-9395-338ab0e9aef0",
-            user_id=user.id,
-            ivion_id="112233",
-            instance_url="https://factory360core.iv.navvis.com",
-            ivion_username=user.ivion_username,
-            ivion_password=user.ivion_password
-        )
+    async def get_SitePois(
+        self,
+        siteId,
+        stream: bool | None = None,
+        query: PoiQuery | None = None,
+    ) -> dict | Response | None:
+        if query is not None and not query.is_empty():
+            # Filtering/paging needs the parsed list, so this never streams
+            pois = await self._cached("sitePoisData", siteId)
+            return self._json_payload(apply_query(pois if isinstance(pois, list) else [], query))
+
+        if stream is None:
+            stream = ivion_settings.SITE_POIS_STREAMING
+        if stream:
+            # Streamed bodies are never buffered, so they bypass the cache
+            try:
+                return await self._fetch_SitePois(siteId, stream=True)
+            except UpstreamUnavailable:
+                value = response_cache.fallback(
+                    "sitePois", siteId, ivion_settings.CIRCUIT_STALE_MAX_AGE_SECONDS
+                )
+                if value is None:
+                    raise
+                return value
+        return await self._cached("sitePois", siteId)
+
+    async def _fetch_SitePois(self, siteId, stream: bool = False) -> dict | Response | None:
+        site_user = await self._get_site_user()
         token = await self.get_token()
-        print("🔧 [DEBUG] token: ", token)
+        if stream:
+            return await self._stream_SitePois(site_user=site_user, site_id=siteId, jwt_token=token.get("access_token"))
         Sites = await self._get_SitePois(site_user=site_user, site_id=siteId, jwt_token=token.get("access_token"))
-
-        print("🔧 [DEBUG] sites: ", Sites)
+        logger.debug("Fetched site POIs", extra={"site_id": siteId})
         return  Sites
 
 
-    async def get_signedUrl(self, siteId) -> dict | None:
-        user = await self._get_user()
-        site_user = SiteUser(
-            site_id="1a2cfa81-9677-4b3f-9395-338ab0e9aef0",
-            user_id=user.id,
-            ivion_id="112233",
-            instance_url="https://factory360core.iv.navvis.com",
-            ivion_username=user.ivion_username,
-            ivion_password=user.ivion_password
+    async def get_SiteInfo_data(self, siteId) -> dict:
+        """Upstream site info parsed into python objects"""
+        site_user = await self._get_site_user()
+        token = await self.get_token()
+        response = await self._upstream_get(
+            site_user,
+            token.get("access_token"),
+            site_user.instance_url + "/api/sites/" + siteId,
+            operation="siteInfo",
         )
+        return orjson.loads(response.content)
+
+    async def get_SitePois_data(self, siteId) -> list:
+        """Upstream POI list of a site parsed into python objects"""
+        site_user = await self._get_site_user()
+        token = await self.get_token()
+        response = await self._upstream_get(
+            site_user,
+            token.get("access_token"),
+            site_user.instance_url + "/api/site/" + siteId + "/pois",
+            operation="sitePois",
+        )
+        return orjson.loads(response.content)
+
+    async def get_signedUrl(self, siteId) -> dict | None:
+        site_user = await self._get_site_user()
         token = await self.get_token()
-        print("🔧 [DEBUG] token: ", token)
         # Sites = await self._get_SitePois(site_user=site_user, site_id=siteId, jwt_token=token.get("access_token"))
 
-        signedUrl = "https://core.factory360.world/login?autologin=true&InstanceUrl=https://factory360core.iv.navvis.com/&access_token="+token.get("access_token")+"&refresh_token="+token.get("refresh_token")+"&siteId="+siteId
+        return self._signed_url(token, siteId)
+
+    def _signed_url(self, token: dict, siteId: str) -> dict:
+        signedUrl = "https://core.factory360.world/login?autologin=true&InstanceUrl="+ivion_settings.IVION_INSTANCE_URL+"/&access_token="+token.get("access_token")+"&refresh_token="+token.get("refresh_token")+"&siteId="+siteId
+
+        return  {"signedUrl": signedUrl}
+
+    async def batch(self, operations: list[BatchOperation]) -> dict:
+        """
+        Run many siteInfo/sitePois/access operations with a single user
+        lookup and token, fanning the upstream calls out concurrently.
+        Every operation gets its own result or error.
+        """
+        if len(operations) > ivion_settings.BATCH_MAX_OPERATIONS:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"At most {ivion_settings.BATCH_MAX_OPERATIONS} operations per batch",
+            )
+
+        site_user = await self._get_site_user()
+        token = (await self._get_session(site_user)).get("data", {})
+        semaphore = asyncio.Semaphore(ivion_settings.BATCH_CONCURRENCY)
+
+        results = await asyncio.gather(*(
+            self._batch_operation(operation, site_user, token, semaphore)
+            for operation in operations
+        ))
+        return {"results": list(results)}
 
-        return  {"signedUrl": signedUrl}
\ No newline at end of file
+    async def _batch_operation(
+        self,
+        operation: BatchOperation,
+        site_user: SiteUser,
+        token: dict,
+        semaphore: asyncio.Semaphore,
+    ) -> dict:
+        result = {"op": operation.op, "siteId": operation.siteId}
+        try:
+            async with semaphore:
+                result["data"] = await self._run_batch_operation(operation, site_user, token)
+            result["status_code"] = status.HTTP_200_OK
+        except HTTPException as e:
+            result["status_code"] = e.status_code
+            result["error"] = e.detail
+        except Exception as e:
+            result["status_code"] = status.HTTP_500_INTERNAL_SERVER_ERROR
+            result["error"] = str(e)
+        return result
+
+    async def _run_batch_operation(
+        self,
+        operation: BatchOperation,
+        site_user: SiteUser,
+        token: dict,
+    ):
+        siteId = operation.siteId
+        if operation.op == "access":
+            return self._signed_url(token, siteId)
+
+        if operation.op == "siteInfo":
+            endpoint = "siteInfoData"
+            url = site_user.instance_url + "/api/sites/" + siteId
+        else:
+            endpoint = "sitePoisData"
+            url = site_user.instance_url + "/api/site/" + siteId + "/pois"
+
+        hit = response_cache.get(endpoint, siteId) if ivion_settings.RESPONSE_CACHE_ENABLED else None
+        if hit is not None:
+            value, fresh = hit
+            if not fresh:
+                response_cache.revalidate(
+                    endpoint, siteId, lambda: self._revalidate(endpoint, siteId)
+                )
+            return value
+
+        try:
+            response = await self._upstream_get(site_user, token.get("access_token"), url, operation=operation.op)
+        except UpstreamUnavailable:
+            value = response_cache.fallback(
+                endpoint, siteId, ivion_settings.CIRCUIT_STALE_MAX_AGE_SECONDS
+            )
+            if value is None:
+                raise
+            return value
+        value = orjson.loads(response.content)
+        if ivion_settings.RESPONSE_CACHE_ENABLED:
+            response_cache.set(endpoint, siteId, value)
+        return value
\ No newline at end of file
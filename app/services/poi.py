@@ -0,0 +1,216 @@
+import hashlib
+import logging
+from datetime import datetime
+from uuid import uuid4
+
+import orjson
+import sqlalchemy as sa
+from fastapi import HTTPException, Response, status
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.schemas.user import PoiQuery
+from app.config import ivion_settings
+from app.core.poi_query import (
+    POI_TYPE_GROUP_ID_PATHS,
+    POI_TYPE_ID_PATHS,
+    build_page,
+    decode_cursor,
+    parse_timestamp,
+    poi_updated_at,
+)
+from app.database.models import Poi, PoiSyncState
+from app.services.openpack import OpenpackService
+
+logger = logging.getLogger(__name__)
+
+def _json_first(data, paths: tuple[tuple[str, ...], ...]):
+    """SQL twin of poi_query._first_id: text of the first non-null path"""
+    return sa.func.coalesce(*(data[path].astext for path in paths))
+
+
+class PoiService:
+    """Mirror of IVION POIs in the poi table, synced incrementally per site"""
+
+    def __init__(self, session: AsyncSession, openpack: OpenpackService | None, model=Poi):
+        self.model = model
+        self.session = session
+        self.openpack = openpack
+
+    async def _get_sync_state(self, site_id: str) -> PoiSyncState | None:
+        return await self.session.get(PoiSyncState, site_id)
+
+    async def get_synced_site_ids(self) -> list[str]:
+        result = await self.session.execute(select(PoiSyncState.site_id))
+        return list(result.scalars().all())
+
+    def _to_row(self, site_id: str, poi: dict, now: datetime) -> dict | None:
+        poi_id = poi.get("id")
+        if poi_id is None:
+            return None
+        return {
+            "id": uuid4(),
+            "poi_url": f"/api/poi/{poi_id}",
+            "site_id": site_id,
+            "ivion_poi_id": str(poi_id),
+            "data": poi,
+            "data_hash": hashlib.md5(
+                orjson.dumps(poi, option=orjson.OPT_SORT_KEYS)
+            ).hexdigest(),
+            "updated_at": poi_updated_at(poi),
+            "synced_at": now,
+        }
+
+    async def _upsert(self, rows: list[dict]) -> None:
+        """Multi-row INSERT ... ON CONFLICT, rows whose hash is unchanged are left alone"""
+        batch_size = ivion_settings.POI_SYNC_BATCH_SIZE
+        for start in range(0, len(rows), batch_size):
+            stmt = insert(self.model).values(rows[start:start + batch_size])
+            stmt = stmt.on_conflict_do_update(
+                constraint="uq_poi_site_ivion_poi",
+                set_={
+                    "poi_url": stmt.excluded.poi_url,
+                    "data": stmt.excluded.data,
+                    "data_hash": stmt.excluded.data_hash,
+                    "updated_at": stmt.excluded.updated_at,
+                    "synced_at": stmt.excluded.synced_at,
+                },
+                where=self.model.data_hash != stmt.excluded.data_hash,
+            )
+            await self.session.execute(stmt)
+
+    async def _save_sync_state(
+        self,
+        site_id: str,
+        synced_at: datetime,
+        watermark: datetime | None,
+        poi_count: int,
+    ) -> PoiSyncState:
+        """
+        INSERT ... ON CONFLICT for the sync state row, two first syncs of a
+        site racing each other both succeed. The watermark is only moved
+        when this sync saw modification times.
+        """
+        table = PoiSyncState.__table__
+        stmt = insert(PoiSyncState).values(
+            site_id=site_id,
+            synced_at=synced_at,
+            watermark=watermark,
+            poi_count=poi_count,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.site_id],
+            set_={
+                "synced_at": stmt.excluded.synced_at,
+                "watermark": sa.func.coalesce(stmt.excluded.watermark, table.c.watermark),
+                "poi_count": stmt.excluded.poi_count,
+            },
+        ).returning(PoiSyncState)
+        result = await self.session.execute(
+            select(PoiSyncState).from_statement(stmt),
+            execution_options={"populate_existing": True},
+        )
+        return result.scalar_one()
+
+    async def _delete_missing(self, site_id: str, poi_ids: list[str]) -> int:
+        """Remove mirrored POIs of the site that no longer exist upstream"""
+        ids = sa.bindparam("poi_ids", poi_ids, type_=ARRAY(sa.String))
+        result = await self.session.execute(
+            delete(self.model).where(
+                self.model.site_id == site_id,
+                self.model.ivion_poi_id != sa.all_(ids),
+            )
+        )
+        return result.rowcount
+
+    async def sync_site(self, site_id: str, allow_empty: bool = False) -> PoiSyncState:
+        """
+        Bring the mirror of a site in line with upstream. An upstream list
+        without a single usable POI only empties an existing mirror with
+        `allow_empty`, otherwise it is taken for an upstream fault.
+        """
+        pois = await self.openpack.get_SitePois_data(site_id)
+        if not isinstance(pois, list):
+            # An error envelope or a changed schema, not an empty site
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Unexpected upstream POI payload for site {site_id}",
+            )
+        now = datetime.now()
+
+        # Keyed by POI id, a statement can't upsert the same row twice
+        rows = {}
+        for poi in pois:
+            row = self._to_row(site_id, poi, now)
+            if row is not None:
+                rows[row["ivion_poi_id"]] = row
+
+        if not rows and not allow_empty:
+            state = await self._get_sync_state(site_id)
+            if state is not None:
+                # Not recorded as a sync, the mirror is left as it was
+                logger.warning(
+                    "Upstream returned no POIs for site %s, keeping the mirrored ones",
+                    site_id,
+                )
+                return state
+
+        try:
+            await self._upsert(list(rows.values()))
+            if rows or allow_empty:
+                await self._delete_missing(site_id, list(rows.keys()))
+
+            updated = [row["updated_at"] for row in rows.values() if row["updated_at"]]
+            state = await self._save_sync_state(
+                site_id, synced_at=now, watermark=max(updated, default=None), poi_count=len(rows)
+            )
+
+            await self.session.commit()
+        except Exception:
+            await self.session.rollback()
+            raise
+
+        await self.session.refresh(state)
+        return state
+
+    async def _get_local_pois(self, site_id: str, query: PoiQuery | None = None) -> list[dict]:
+        stmt = select(self.model.data).where(self.model.site_id == site_id)
+        # Shorter ids first, then byte-wise, like poi_query.poi_sort_key, so
+        # numeric ids page in numeric order whatever the database collation
+        poi_id = self.model.ivion_poi_id.collate("C")
+
+        if query is not None:
+            data = self.model.data
+            if query.poi_type:
+                type_id = _json_first(data, POI_TYPE_ID_PATHS)
+                stmt = stmt.where(type_id.in_(query.poi_type))
+            if query.poi_type_group:
+                group_id = _json_first(data, POI_TYPE_GROUP_ID_PATHS)
+                stmt = stmt.where(group_id.in_(query.poi_type_group))
+            if query.modified_since is not None:
+                stmt = stmt.where(
+                    self.model.updated_at > parse_timestamp(query.modified_since)
+                )
+            if query.cursor:
+                after = decode_cursor(query.cursor)
+                stmt = stmt.where(
+                    sa.tuple_(sa.func.length(poi_id), poi_id) > sa.tuple_(len(after), after)
+                )
+            if query.limit:
+                stmt = stmt.limit(query.limit + 1)
+
+        stmt = stmt.order_by(sa.func.length(poi_id), poi_id)
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def get_SitePois(self, site_id: str, query: PoiQuery | None = None) -> dict | Response:
+        # First request for a site populates the mirror
+        if await self._get_sync_state(site_id) is None:
+            await self.sync_site(site_id)
+
+        if query is None or query.is_empty():
+            return self.openpack._json_payload(await self._get_local_pois(site_id))
+
+        pois = await self._get_local_pois(site_id, query)
+        return self.openpack._json_payload(build_page(pois, query))
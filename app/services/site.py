@@ -1,4 +1,5 @@
-from datetime import datetime, timedelta, timezone
+import logging
+from datetime import datetime, timezone
 from typing import Optional
 from uuid import UUID, uuid4
 import uuid
@@ -7,19 +8,33 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import BackgroundTasks, HTTPException, status
 from app.api.schemas.user import SiteCreate, SiteUser
-from app.database.models import Session, Site, User, UserSiteLink
-from passlib.context import CryptContext
-from app.utils import generate_access_token, generate_url_safe_token
+from app.config import ivion_settings
+from app.core.circuit_breaker import UpstreamUnavailable
+from app.core.credential_cache import credential_cache
+from app.core.invalidation import publish_invalidation
+from app.core.http import IvionHttpClients
+from app.core.metrics import upstream_timer
+from app.core.tracing import trace_methods
+from app.database.models import Site, User, UserSiteLink
+from app.services.openpack import store_session
+from app.utils import sign_access_token, verify_password
 
-password_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto",
-)
+logger = logging.getLogger(__name__)
 
+
+@trace_methods
 class SiteService:
-    def __init__(self, session: AsyncSession, model=Site):
+    def __init__(
+        self,
+        session: AsyncSession,
+        http_clients: IvionHttpClients,
+        model=Site,
+        read_session: AsyncSession | None = None,
+    ):
         self.model = model
         self.session = session
+        self.read_session = read_session or session
+        self.http_clients = http_clients
 
     async def _get(self, id: UUID):
         return await self.session.get(self.model, id)
@@ -29,10 +44,26 @@ class SiteService:
 
     async def _add(self, entity):
         self.session.add(entity)
+        await self.session.flush()
+        await self._publish(entity)
         await self.session.commit()
         await self.session.refresh(entity)
+        self._invalidate(entity)
         return entity
 
+    async def _publish(self, entity) -> None:
+        # Delivered to the other workers when the transaction commits
+        if isinstance(entity, Site):
+            await publish_invalidation(self.session, "site", entity.id)
+        elif isinstance(entity, User):
+            await publish_invalidation(self.session, "user", entity.id, entity.username)
+
+    def _invalidate(self, entity) -> None:
+        if isinstance(entity, Site):
+            credential_cache.invalidate_site(entity.id)
+        elif isinstance(entity, User):
+            credential_cache.invalidate_user(entity.id, entity.username)
+
     async def _get_site_url(self, id: UUID):
         sitee= await self._get(id)
         url=sitee.instance_url
@@ -48,6 +79,8 @@ class SiteService:
     
     async def _delete(self, entity):
         await self.session.delete(entity)
+        await self._publish(entity)
+        self._invalidate(entity)
 
     async def _add_Site(self, data: dict, router_prefix: str) -> Site:
         # Create a copy of the data and extract password
@@ -66,7 +99,7 @@ class SiteService:
         # Validate the credentials
         user = await self._get_by_email(email)
 
-        if user is None or not password_context.verify(
+        if user is None or not await verify_password(
             password,
             user.hashed_password,
         ):
@@ -81,7 +114,7 @@ class SiteService:
                 detail="Email not verified",
             )
 
-        return generate_access_token(
+        return await sign_access_token(
             data={
                 "user": {
                     "name": user.name,
@@ -112,20 +145,19 @@ class SiteService:
             "username": site_user.ivion_password,     # ✅ Fixed
             "password": site_user.ivion_username,     # ✅ Fixed
         }
-        print(f"🔧 [DEBUG] Payload: {payload}")
-
         headers = {"Content-Type": "application/json"}
 
         try:
-            async with httpx.AsyncClient() as client:
+            client = self.http_clients.get(site_user.instance_url)
+            with upstream_timer("login") as timer:
                 response = await client.post(
                     url=site_user.instance_url + "/api/auth/generate_tokens",
                     json=payload,
                     headers=headers,
-                    timeout=10.0
                 )
-                print(f"📤 POST {site_user.instance_url}/api/auth/generate_tokens → {response.status_code}")
-                response.raise_for_status()
+                timer.status = response.status_code
+            logger.debug("POST %s/api/auth/generate_tokens -> %s", site_user.instance_url, response.status_code)
+            response.raise_for_status()
 
             # Parse response
             content_type = response.headers.get("content-type", "").lower()
@@ -136,24 +168,11 @@ class SiteService:
                 "text": response.text if "application/json" not in content_type else None
             }
 
-            # ✅ Create and persist local session
-            now = datetime.now()
-            session_obj = Session(
-                id=uuid.uuid4(),
-                created_at=now,
-                expering_at=now + timedelta(hours=1),  # or parse expiry from response if available
-                user_id=site_user.user_id,    # ensure SiteUser has this
-                site_id=site_user.site_id,    # ensure SiteUser has this
-                data=response_data["json"] or {},  # e.g., store tokens, user info — use dict, not str
-            )
-
-            self.session.add(session_obj)
-            await self.session.commit()
-            await self.session.refresh(session_obj)  # get DB-generated fields if any
-
-            # ✅ Return enriched response
-            return session_obj.__dict__
+            # ✅ Create and persist local session, expiring with the token
+            return await store_session(self.session, site_user, response_data["json"] or {}, source="site_cred")
 
+        except UpstreamUnavailable:
+            raise
         except httpx.HTTPStatusError as e:
             raise HTTPException(
                 status_code=e.response.status_code,
@@ -184,7 +203,12 @@ class SiteService:
             SiteUser object containing site_id, instance_url, ivion_username, and ivion_password
             Returns None if site or linked user not found
         """
-        print(f"🔧 [DEBUG] Getting site with user credentials for site_id: {site_id}")
+        logger.debug("Getting site credentials", extra={"site_id": str(site_id)})
+
+        key = ("site", str(site_id))
+        site_user = credential_cache.get(key)
+        if site_user is not None:
+            return site_user
         
         try:
             # Query to get site and linked user in one go
@@ -195,16 +219,14 @@ class SiteService:
                 .where(Site.id == site_id)
             )
             
-            result = await self.session.execute(stmt)
+            result = await self.read_session.execute(stmt)
             row = result.first()
             
             if not row:
-                print(f"❌ [DEBUG] No site found with ID: {site_id} or no linked user")
+                logger.warning("No site found with ID %s or no linked user", site_id)
                 return None
             
             site, user = row
-            print(f"🔧 [DEBUG] Found site: {site.name}, user: {user.username}")
-            
             # Create and return the SiteUser object
             site_user = SiteUser(
                 site_id=site.id,
@@ -215,17 +237,16 @@ class SiteService:
                 ivion_password=user.ivion_password
             )
             
-            print(f"🔧 [DEBUG] Successfully created SiteUser for site: {site.name}")
+            credential_cache.set(key, site_user)
 
-            print("Trying to login")
-            response =await self._generate_session(site_user)
-            print(response)
+            await self._generate_session(site_user)
+            logger.debug("Created IVION session for site %s", site.name)
             return site_user
             
 
             
-        except Exception as e:
-            print(f"❌ [DEBUG] Error in get_site_with_user_credentials: {e}")
+        except Exception:
+            logger.exception("Error in get_site_cred for site %s", site_id)
             return None
     
 
@@ -244,7 +265,7 @@ class SiteService:
             site_id="1a2cfa81-9677-4b3f-9395-338ab0e9aef0",
             user_id=user.id,
             ivion_id="112233",
-            instance_url="https://factory360core.iv.navvis.com",
+            instance_url=ivion_settings.IVION_INSTANCE_URL,
             ivion_username=user.ivion_username,
             ivion_password=user.ivion_password
         )
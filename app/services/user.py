@@ -1,18 +1,18 @@
+import logging
 from typing import List
 from uuid import UUID
 from sqlalchemy import insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import BackgroundTasks, HTTPException, status
 from app.api.schemas.user import UserCreate
+from app.core.credential_cache import credential_cache
+from app.core.invalidation import publish_invalidation
 from app.database.models import Site, User, UserSiteLink
-from passlib.context import CryptContext
 from app.api.schemas.user import UserCreate
-from app.utils import generate_access_token, generate_url_safe_token
+from app.utils import generate_url_safe_token, hash_password, sign_access_token, verify_password
+
+logger = logging.getLogger(__name__)
 
-password_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto",
-)
 
 class UserService:
     def __init__(self, session: AsyncSession, model=User):
@@ -24,8 +24,12 @@ class UserService:
     
     async def _add(self, entity):
         self.session.add(entity)
+        # Flushed first so the id is known to the other workers
+        await self.session.flush()
+        await publish_invalidation(self.session, "user", entity.id, entity.username)
         await self.session.commit()
         await self.session.refresh(entity)
+        credential_cache.invalidate_user(entity.id, entity.username)
         return entity
     
     async def _update(self, entity):
@@ -33,6 +37,8 @@ class UserService:
     
     async def _delete(self, entity):
         await self.session.delete(entity)
+        await publish_invalidation(self.session, "user", entity.id, entity.username)
+        credential_cache.invalidate_user(entity.id, entity.username)
     
     # async def _add_user(self, data: dict, router_prefix: str) -> User:
     #     user = self.model(
@@ -58,7 +64,7 @@ class UserService:
         plaintext_password = user_data.pop("password")
         
         # Hash the password
-        password_hash = password_context.hash(plaintext_password[:72])
+        password_hash = await hash_password(plaintext_password[:72])
         
         # Create user with BOTH password fields set to the hash
         user = self.model(
@@ -81,7 +87,7 @@ class UserService:
         # Validate the credentials
         user = await self._get_by_email(email)
 
-        if user is None or not password_context.verify(
+        if user is None or not await verify_password(
             password,
             user.hashed_password,
         ):
@@ -96,7 +102,7 @@ class UserService:
                 detail="Email not verified",
             )
 
-        return generate_access_token(
+        return await sign_access_token(
             data={
                 "user": {
                     "name": user.name,
@@ -178,32 +184,19 @@ class UserService:
     async def add(self, user_create: UserCreate) -> User:
         user_data = user_create.model_dump(exclude={"site_ids"})
         
-        print(f"🔧 [DEBUG] Starting user creation with username: {user_data.get('username')}")
-        print(f"🔧 [DEBUG] Site IDs to associate: {user_create.site_ids}")
-        
         # Create user first without sites
         user = await self._add_user(user_data, "user")
-        print(f"🔧 [DEBUG] User created with ID: {user.id}")
+        logger.debug("Created user %s", user.id)
         
         # Handle sites in a separate method
         if user_create.site_ids:
-            print(f"🔧 [DEBUG] Adding {len(user_create.site_ids)} sites to user")
-            success_count = await self._add_user_sites(user.id, user_create.site_ids)
-            print(f"🔧 [DEBUG] Successfully added {success_count} site relationships")
-        else:
-            print(f"🔧 [DEBUG] No sites to associate")
+            await self._add_user_sites(user.id, user_create.site_ids)
         
         # Get the complete user with sites
-        complete_user = await self._get_user_with_sites(user.id)
-        print(f"🔧 [DEBUG] Final user sites count: {len(complete_user.sites)}")
-        print(f"🔧 [DEBUG] Final user sites IDs: {[site.id for site in complete_user.sites]}")
-        
-        return complete_user
+        return await self._get_user_with_sites(user.id)
 
     async def _add_user_sites(self, user_id: UUID, site_ids: List[int]) -> int:
         """Add site relationships using the association table"""
-        print(f"🔧 [DEBUG] _add_user_sites called with user_id: {user_id}, site_ids: {site_ids}")
-        
         # First, verify that the sites exist
         result = await self.session.execute(
             select(Site).where(Site.id.in_(site_ids))
@@ -211,15 +204,12 @@ class UserService:
         existing_sites = result.scalars().all()
         existing_site_ids = [site.id for site in existing_sites]
         
-        print(f"🔧 [DEBUG] Found {len(existing_sites)} existing sites: {existing_site_ids}")
-        
         # Check for missing sites
         missing_site_ids = set(site_ids) - set(existing_site_ids)
         if missing_site_ids:
-            print(f"⚠️ [DEBUG] WARNING: Some sites not found: {missing_site_ids}")
+            logger.warning("Sites not found for user %s: %s", user_id, sorted(map(str, missing_site_ids)))
         
         if not existing_sites:
-            print(f"🔧 [DEBUG] No existing sites found, skipping relationship creation")
             return 0
         
         try:
@@ -229,19 +219,23 @@ class UserService:
                 for site in existing_sites
             ]
             
-            print(f"🔧 [DEBUG] Inserting {len(association_records)} records into UserSiteLink: {association_records}")
-            
             # Insert the relationships
             stmt = insert(UserSiteLink).values(association_records)
             result = await self.session.execute(stmt)
+            await publish_invalidation(self.session, "user", user_id)
+            for site in existing_sites:
+                await publish_invalidation(self.session, "site", site.id)
             
             await self.session.commit()
-            print(f"🔧 [DEBUG] Successfully committed {len(association_records)} site relationships")
+            logger.debug("Linked user %s to %d sites", user_id, len(association_records))
+            credential_cache.invalidate_user(user_id)
+            for site in existing_sites:
+                credential_cache.invalidate_site(site.id)
             
             return len(association_records)
             
-        except Exception as e:
-            print(f"❌ [DEBUG] Error in _add_user_sites: {e}")
+        except Exception:
+            logger.exception("Linking sites to user %s failed", user_id)
             await self.session.rollback()
             raise
 
@@ -249,18 +243,9 @@ class UserService:
         """Get user with sites eagerly loaded"""
         from sqlalchemy.orm import selectinload
         
-        print(f"🔧 [DEBUG] _get_user_with_sites called for user_id: {user_id}")
-        
         stmt = select(User).where(User.id == user_id).options(selectinload(User.sites))
         result = await self.session.execute(stmt)
-        user = result.scalar_one()
-        
-        print(f"🔧 [DEBUG] Retrieved user '{user.username}' with {len(user.sites)} sites")
-        if user.sites:
-            for i, site in enumerate(user.sites):
-                print(f"🔧 [DEBUG]   Site {i+1}: {site.name} (ID: {site.id})")
-        
-        return user
+        return result.scalar_one()
 
 
     async def token(self, email, password) -> str:
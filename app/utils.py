@@ -1,14 +1,24 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
+import time
 from uuid import uuid4
 
+from fastapi import HTTPException, status
 from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
 import jwt
+from passlib.context import CryptContext
 
 from app.config import security_settings
 
 _serializer = URLSafeTimedSerializer(security_settings.JWT_SECRET)
 
+password_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+)
+
 
 APP_DIR = Path(__file__).resolve().parent
 TEMPLATE_DIR = APP_DIR / "templates"
@@ -40,6 +50,26 @@ def decode_access_token(token: str) -> dict | None:
         return None
 
 
+def decode_token_expiry(token: str) -> datetime | None:
+    """
+    Expiry of a third-party JWT (e.g. an IVION access token) read from its
+    `exp` claim without verifying the signature. Returned as naive local
+    time to match the timestamps stored on sessions.
+    """
+    try:
+        payload = jwt.decode(
+            jwt=token,
+            options={"verify_signature": False},
+        )
+    except jwt.PyJWTError:
+        return None
+
+    exp = payload.get("exp")
+    if not isinstance(exp, (int, float)):
+        return None
+    return datetime.fromtimestamp(exp)
+
+
 def generate_url_safe_token(data: dict, salt: str | None = None) -> str:
     return _serializer.dumps(data, salt=salt)
 
@@ -57,3 +87,109 @@ def decode_url_safe_token(
         )
     except (BadSignature, SignatureExpired):
         return None
+
+
+class CryptoPool:
+    """
+    Bounded executor for CPU-bound crypto (bcrypt, JWT signing) so it never
+    runs on the event loop. At most `max_workers` jobs run at once and at
+    most `max_queue` wait; beyond that callers get a 503 right away.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, use_processes: bool = False):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.use_processes = use_processes
+        self._executor: Executor | None = None
+        # Jobs submitted and not finished yet, running or waiting for a worker
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.run_seconds_total = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="crypto",
+                )
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, try again later",
+            )
+
+        submitted = time.perf_counter()
+        self.in_flight += 1
+        future = asyncio.get_running_loop().run_in_executor(
+            self._get_executor(), _run_timed, fn, args,
+        )
+        try:
+            result, run_seconds = await future
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+        self.run_seconds_total += run_seconds
+        self.wait_seconds_total += max(time.perf_counter() - submitted - run_seconds, 0.0)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": max(self.in_flight - self.max_workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_seconds_total": self.wait_seconds_total,
+            "run_seconds_total": self.run_seconds_total,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Module level so it can be pickled for process pools
+def _run_timed(fn, args):
+    started = time.perf_counter()
+    return fn(*args), time.perf_counter() - started
+
+
+def _hash_password(password: str) -> str:
+    return password_context.hash(password)
+
+
+def _verify_password(password: str, hashed_password: str) -> bool:
+    return password_context.verify(password, hashed_password)
+
+
+crypto_pool = CryptoPool(
+    max_workers=security_settings.CRYPTO_MAX_WORKERS,
+    max_queue=security_settings.CRYPTO_MAX_QUEUE,
+    use_processes=security_settings.CRYPTO_USE_PROCESSES,
+)
+
+
+async def hash_password(password: str) -> str:
+    return await crypto_pool.run(_hash_password, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await crypto_pool.run(_verify_password, password, hashed_password)
+
+
+async def sign_access_token(
+    data: dict,
+    expiry: timedelta = timedelta(days=7),
+) -> str:
+    return await crypto_pool.run(generate_access_token, data, expiry)
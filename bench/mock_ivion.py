@@ -0,0 +1,218 @@
+"""
+Local stand-in for an IVION instance, for benchmarks and fault drills.
+
+    python -m bench.mock_ivion --port 9000 --latency-ms 80 --error-rate 0.01 --pois 2000
+
+Point the API at it with IVION_INSTANCE_URL=http://localhost:9000. Payloads
+are generated from `--seed`, so two runs with the same options serve the
+same bytes. Latency and errors can be changed on a running server through
+PATCH /_mock/config, calls are counted per route at GET /_mock/stats.
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, fields
+from uuid import UUID
+
+import jwt
+import orjson
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+_SIGNING_KEY = "mock-ivion"
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 50.0
+    # Standard deviation of the latency, a normal distribution cut at 0
+    jitter_ms: float = 10.0
+    error_rate: float = 0.0
+    error_status: int = 502
+    sites: int = 10
+    pois: int = 500
+    # Padding added to every POI to reach realistic payload sizes
+    poi_bytes: int = 512
+    token_ttl_seconds: int = 3600
+    seed: int = 1
+
+
+class MockIvion:
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.calls: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self._generate()
+
+    def _generate(self) -> None:
+        self._rng = random.Random(self.config.seed)
+        self._bodies: dict[str, bytes] = {}
+        self.site_ids = [
+            str(UUID(int=random.Random(self.config.seed + i).getrandbits(128), version=4))
+            for i in range(self.config.sites)
+        ]
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self.errors.clear()
+        self._rng = random.Random(self.config.seed)
+
+    def update(self, changes: dict) -> None:
+        known = {field.name for field in fields(MockConfig)}
+        payload_changed = False
+        for name, value in changes.items():
+            if name in known:
+                setattr(self.config, name, type(getattr(self.config, name))(value))
+                payload_changed |= name in ("sites", "pois", "poi_bytes", "seed")
+        if payload_changed:
+            self._generate()
+
+    async def delay(self, route: str) -> Response | None:
+        """Sleep for the configured latency, returning an error response if this call fails"""
+        self.calls[route] += 1
+        latency = max(self._rng.gauss(self.config.latency_ms, self.config.jitter_ms), 0.0)
+        await asyncio.sleep(latency / 1000)
+        if self._rng.random() < self.config.error_rate:
+            self.errors[route] += 1
+            return Response(
+                content=f"mock upstream error on {route}",
+                status_code=self.config.error_status,
+                media_type="text/plain",
+            )
+        return None
+
+    def token(self, kind: str) -> str:
+        now = int(time.time())
+        return jwt.encode(
+            {"sub": "mock", "kind": kind, "iat": now, "exp": now + self.config.token_ttl_seconds},
+            _SIGNING_KEY,
+            algorithm="HS256",
+        )
+
+    def tokens(self) -> dict:
+        return {
+            "access_token": self.token("access"),
+            "refresh_token": self.token("refresh"),
+            "principal": {
+                "username": "mock",
+                "site_default_group_read": {site_id: True for site_id in self.site_ids},
+            },
+        }
+
+    def _site(self, site_id: str) -> dict:
+        return {"id": site_id, "name": f"Mock site {site_id[:8]}", "description": "", "default_lang": "en"}
+
+    def _body(self, key: str, build) -> bytes:
+        # Rendered once, the mock must not be the bottleneck of a benchmark
+        if key not in self._bodies:
+            self._bodies[key] = orjson.dumps(build())
+        return self._bodies[key]
+
+    def sites_body(self) -> bytes:
+        return self._body("sites", lambda: [self._site(site_id) for site_id in self.site_ids])
+
+    def site_body(self, site_id: str) -> bytes:
+        return self._body(f"site:{site_id}", lambda: self._site(site_id))
+
+    def pois_body(self, site_id: str) -> bytes:
+        def build() -> list[dict]:
+            rng = random.Random(f"{self.config.seed}:{site_id}")
+            return [
+                {
+                    "id": n,
+                    "site_id": site_id,
+                    "title": {"en": f"POI {n}"},
+                    "poi_type_id": rng.randint(1, 20),
+                    "location": {"x": rng.uniform(-500, 500), "y": rng.uniform(-500, 500), "z": rng.uniform(0, 30)},
+                    "modified_date": "2024-01-01T00:00:00",
+                    "custom_data": "x" * self.config.poi_bytes,
+                }
+                for n in range(1, self.config.pois + 1)
+            ]
+        return self._body(f"pois:{site_id}", build)
+
+    def stats(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "errors": dict(self.errors),
+            "total_calls": sum(self.calls.values()),
+            "config": asdict(self.config),
+        }
+
+
+def create_app(config: MockConfig | None = None) -> FastAPI:
+    mock = MockIvion(config or MockConfig())
+    app = FastAPI(title="Mock IVION")
+    app.state.mock = mock
+
+    def json_response(body: bytes) -> Response:
+        return Response(content=body, media_type="application/json")
+
+    @app.post("/api/auth/generate_tokens")
+    async def generate_tokens():
+        if error := await mock.delay("generate_tokens"):
+            return error
+        return json_response(orjson.dumps(mock.tokens()))
+
+    @app.post("/api/auth/refresh_access_token")
+    async def refresh_access_token():
+        if error := await mock.delay("refresh_access_token"):
+            return error
+        return json_response(orjson.dumps({"access_token": mock.token("access")}))
+
+    @app.get("/api/sites")
+    async def sites():
+        if error := await mock.delay("sites"):
+            return error
+        return json_response(mock.sites_body())
+
+    @app.get("/api/sites/{site_id}")
+    async def site(site_id: str):
+        if error := await mock.delay("site"):
+            return error
+        return json_response(mock.site_body(site_id))
+
+    @app.get("/api/site/{site_id}/pois")
+    async def pois(site_id: str):
+        if error := await mock.delay("pois"):
+            return error
+        return json_response(mock.pois_body(site_id))
+
+    @app.get("/_mock/stats")
+    async def stats():
+        return mock.stats()
+
+    @app.post("/_mock/reset")
+    async def reset():
+        mock.reset()
+        return mock.stats()
+
+    @app.patch("/_mock/config")
+    async def update_config(request: Request):
+        mock.update(orjson.loads(await request.body()))
+        return mock.stats()
+
+    return app
+
+
+def main() -> None:
+    defaults = MockConfig()
+    parser = argparse.ArgumentParser(description="Mock IVION upstream")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    for field in fields(MockConfig):
+        parser.add_argument(
+            "--" + field.name.replace("_", "-"),
+            type=type(getattr(defaults, field.name)),
+            default=getattr(defaults, field.name),
+        )
+    args = parser.parse_args()
+
+    config = MockConfig(**{field.name: getattr(args, field.name) for field in fields(MockConfig)})
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
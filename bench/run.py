@@ -0,0 +1,234 @@
+"""
+Load test the API against the mock IVION server.
+
+    python -m bench.mock_ivion --port 9000 &
+    IVION_INSTANCE_URL=http://localhost:9000 uvicorn app.main:app --port 8000 &
+    python -m bench.run --token $OPENPACK_TOKEN --mock-url http://localhost:9000 \\
+        --scenarios siteInfo,sitePois --concurrency 32 --requests 2000 \\
+        --output results.json --compare baseline.json
+
+Every scenario is driven by a closed loop of `--concurrency` clients
+sending a fixed number of requests, after a warmup that fills the caches.
+Sites are visited round-robin, so the same options always send the same
+request sequence. Upstream calls are read from the mock's counters.
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+import orjson
+
+# name -> (method, path); {site} is an IVION site id, {user_site} a site UUID of this API
+SCENARIOS = {
+    "sites": ("GET", "/openpack/sites"),
+    "auth": ("GET", "/openpack/auth"),
+    "siteInfo": ("GET", "/openpack/siteInfo/?siteId={site}"),
+    "sitePois": ("GET", "/openpack/sitePois/?siteId={site}"),
+    "access": ("GET", "/openpack/access?siteId={site}"),
+    "batch": ("POST", "/openpack/batch"),
+    "siteCred": ("GET", "/user/siteCred?id={user_site}"),
+    "site": ("GET", "/user/site?id={user_site}"),
+}
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(p / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def _requests(name: str, count: int, sites: list[str], user_sites: list[str]) -> list[tuple[str, str, bytes | None]]:
+    method, template = SCENARIOS[name]
+    if "{site}" in template and not sites:
+        raise SystemExit(f"{name} needs --site-id or --mock-url")
+    if "{user_site}" in template and not user_sites:
+        raise SystemExit(f"{name} needs --user-site-id")
+
+    requests = []
+    for n in range(count):
+        site = sites[n % len(sites)] if sites else ""
+        user_site = user_sites[n % len(user_sites)] if user_sites else ""
+        body = None
+        if name == "batch":
+            body = orjson.dumps({"operations": [
+                {"op": op, "siteId": site_id} for site_id in sites for op in ("siteInfo", "sitePois")
+            ]})
+        requests.append((method, template.format(site=site, user_site=user_site), body))
+    return requests
+
+
+async def _drive(
+    client: httpx.AsyncClient,
+    requests: list[tuple[str, str, bytes | None]],
+    concurrency: int,
+) -> tuple[list[float], Counter]:
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    indexes = itertools.count()
+
+    async def worker() -> None:
+        for index in indexes:
+            if index >= len(requests):
+                return
+            method, path, body = requests[index]
+            start = time.perf_counter()
+            try:
+                response = await client.request(
+                    method, path, content=body,
+                    headers={"Content-Type": "application/json"} if body else None,
+                )
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    mock: httpx.AsyncClient | None,
+    name: str,
+    args: argparse.Namespace,
+    sites: list[str],
+) -> dict:
+    if args.warmup:
+        await _drive(client, _requests(name, args.warmup, sites, args.user_site_id), args.concurrency)
+    if mock is not None:
+        (await mock.post("/_mock/reset")).raise_for_status()
+
+    start = time.perf_counter()
+    latencies, statuses = await _drive(
+        client, _requests(name, args.requests, sites, args.user_site_id), args.concurrency
+    )
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    result = {
+        "requests": len(latencies),
+        "errors": sum(count for status, count in statuses.items() if not status.startswith(("2", "3"))),
+        "statuses": dict(statuses),
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+    if mock is not None:
+        upstream = (await mock.get("/_mock/stats")).json()
+        result["upstream_calls"] = upstream["total_calls"]
+        result["upstream_calls_by_route"] = upstream["calls"]
+    return result
+
+
+async def run(args: argparse.Namespace) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.base_url,
+        headers={"Authorization": f"Token {args.token}"},
+        limits=limits,
+        timeout=args.timeout,
+    ) as client:
+        mock = httpx.AsyncClient(base_url=args.mock_url, timeout=args.timeout) if args.mock_url else None
+        try:
+            sites = list(args.site_id)
+            mock_config = None
+            if mock is not None:
+                mock_config = (await mock.get("/_mock/stats")).json()["config"]
+                if not sites:
+                    listed = (await mock.get("/api/sites")).json()
+                    sites = [site["id"] for site in listed][:args.sites]
+
+            results = {}
+            for name in args.scenarios:
+                results[name] = await run_scenario(client, mock, name, args, sites)
+        finally:
+            if mock is not None:
+                await mock.aclose()
+
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "options": {
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "sites": len(sites),
+        },
+        "mock": mock_config,
+        "scenarios": results,
+    }
+
+
+def _change(current: float, baseline: float) -> str:
+    if not baseline:
+        return "n/a"
+    return f"{(current - baseline) / baseline * 100:+.1f}%"
+
+
+def report(results: dict, baseline: dict | None) -> str:
+    columns = ("requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms", "upstream_calls")
+    lines = [f"{'scenario':<10}" + "".join(f"{column:>15}" for column in columns)]
+    for name, result in results["scenarios"].items():
+        lines.append(f"{name:<10}" + "".join(f"{result.get(column, '-'):>15}" for column in columns))
+
+    if baseline is not None:
+        lines.append("")
+        lines.append(f"compared to the run of {baseline.get('started_at')}:")
+        for name, result in results["scenarios"].items():
+            previous = baseline.get("scenarios", {}).get(name)
+            if previous is None:
+                continue
+            lines.append(
+                f"{name:<10} rps {_change(result['rps'], previous['rps'])}"
+                f"  p95 {_change(result['p95_ms'], previous['p95_ms'])}"
+                f"  p99 {_change(result['p99_ms'], previous['p99_ms'])}"
+                f"  upstream calls {_change(result.get('upstream_calls', 0), previous.get('upstream_calls', 0))}"
+            )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the API against the mock IVION server")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True, help="OPENPACK_TOKEN of the API")
+    parser.add_argument("--mock-url", help="Mock IVION server, for site ids and upstream call counts")
+    parser.add_argument(
+        "--scenarios",
+        type=lambda value: value.split(","),
+        default=["siteInfo", "sitePois"],
+        help=f"Comma separated, of {', '.join(SCENARIOS)}",
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=100, help="Unmeasured requests sent first")
+    parser.add_argument("--site-id", action="append", default=[], help="IVION site id, repeatable")
+    parser.add_argument("--sites", type=int, default=5, help="Sites taken from the mock without --site-id")
+    parser.add_argument("--user-site-id", action="append", default=[], help="Site UUID for /user/*, repeatable")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    parser.add_argument("--compare", type=Path, help="Results JSON of an earlier run")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = asyncio.run(run(args))
+    if args.output:
+        args.output.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+    baseline = orjson.loads(args.compare.read_bytes()) if args.compare else None
+    print(report(results, baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core import circuit_breaker
+from app.core.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitBreakerTransport,
+    UpstreamUnavailable,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def _breaker(**options) -> CircuitBreaker:
+    return CircuitBreaker(**{
+        "instance_url": "https://ivion.test",
+        "window_seconds": 10,
+        "min_calls": 4,
+        "failure_rate": 0.5,
+        "slow_call_seconds": 1.0,
+        "slow_call_rate": 0.8,
+        "open_seconds": 30,
+        "half_open_probes": 2,
+        **options,
+    })
+
+
+def _open(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.min_calls):
+        breaker.record(False, 0.01)
+    assert breaker.state == OPEN
+
+
+def test_stays_closed_below_min_calls(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record(False, 0.01)
+    assert breaker.state == CLOSED
+    breaker.acquire()
+
+
+def test_opens_on_failure_rate_and_rejects(clock):
+    breaker = _breaker()
+    for success in (True, False, True, False):
+        breaker.record(success, 0.01)
+    assert breaker.state == OPEN
+
+    clock.now += 10.2
+    with pytest.raises(UpstreamUnavailable) as rejected:
+        breaker.acquire()
+    assert rejected.value.status_code == 503
+    assert rejected.value.headers["Retry-After"] == "20"
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_opens_on_slow_call_rate(clock):
+    breaker = _breaker()
+    for duration in (2.0, 2.0, 2.0, 2.0, 0.1):
+        breaker.record(True, duration)
+    assert breaker.state == OPEN
+
+
+def test_old_calls_leave_the_window(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record(False, 0.01)
+    clock.now += 11
+    for _ in range(3):
+        breaker.record(True, 0.01)
+    # The three failures are outside the window, 0 of 3 calls failed
+    breaker.record(False, 0.01)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probes_close_the_circuit(clock):
+    breaker = _breaker()
+    _open(breaker)
+    clock.now += 30
+
+    breaker.acquire()
+    assert breaker.state == HALF_OPEN
+    breaker.acquire()
+    with pytest.raises(UpstreamUnavailable):
+        breaker.acquire()
+
+    breaker.record(True, 0.01)
+    assert breaker.state == HALF_OPEN
+    breaker.record(True, 0.01)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["calls"] == 0
+
+
+def test_failed_or_slow_probe_reopens(clock):
+    for duration, success in ((0.01, False), (5.0, True)):
+        breaker = _breaker()
+        _open(breaker)
+        clock.now += 30
+        breaker.acquire()
+        breaker.record(success, duration)
+        assert breaker.state == OPEN
+        with pytest.raises(UpstreamUnavailable):
+            breaker.acquire()
+
+
+def test_released_probe_frees_its_slot(clock):
+    breaker = _breaker(half_open_probes=1)
+    _open(breaker)
+    clock.now += 30
+    breaker.acquire()
+    with pytest.raises(UpstreamUnavailable):
+        breaker.acquire()
+    breaker.release()
+    breaker.acquire()
+
+
+def _transport(breaker: CircuitBreaker, handler) -> CircuitBreakerTransport:
+    return CircuitBreakerTransport(httpx.MockTransport(handler), breaker)
+
+
+async def _get(transport: CircuitBreakerTransport) -> httpx.Response:
+    async with httpx.AsyncClient(transport=transport) as client:
+        return await client.get("https://ivion.test/api/sites")
+
+
+def test_transport_counts_5xx_and_transport_errors(clock):
+    breaker = _breaker(min_calls=100)
+
+    asyncio.run(_get(_transport(breaker, lambda request: httpx.Response(200))))
+    asyncio.run(_get(_transport(breaker, lambda request: httpx.Response(404))))
+    asyncio.run(_get(_transport(breaker, lambda request: httpx.Response(502))))
+
+    def refuse(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(_get(_transport(breaker, refuse)))
+
+    assert breaker.stats()["calls"] == 4
+    assert breaker.stats()["failures"] == 2
+
+
+def test_transport_rejects_without_calling_upstream(clock):
+    breaker = _breaker()
+    _open(breaker)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200)
+
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(_get(_transport(breaker, handler)))
+    assert calls == []
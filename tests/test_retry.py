@@ -0,0 +1,166 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.retry import LatencyTracker, RetryBudget, UpstreamRetry
+
+
+def _retry(**options) -> UpstreamRetry:
+    return UpstreamRetry(**{
+        "attempts": 3,
+        "base_delay": 0.001,
+        "max_delay": 0.002,
+        "retry_statuses": {502, 503, 504},
+        "budget": RetryBudget(ratio=1.0, burst=10),
+        "hedging": False,
+        "hedge_quantile": 0.5,
+        "hedge_min_delay": 0.0,
+        "hedge_min_samples": 1,
+        **options,
+    })
+
+
+def _responses(*statuses: int):
+    """send() answering with `statuses` in turn, counting the calls"""
+    calls = []
+
+    async def send() -> httpx.Response:
+        calls.append(len(calls))
+        return httpx.Response(statuses[min(len(calls) - 1, len(statuses) - 1)])
+
+    return send, calls
+
+
+def test_budget_is_exhausted_after_burst():
+    budget = RetryBudget(ratio=0.5, burst=2)
+    assert budget.withdraw()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    assert budget.exhausted == 1
+
+    # Two original calls earn one extra call
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def test_budget_saves_at_most_burst():
+    budget = RetryBudget(ratio=1.0, burst=2)
+    for _ in range(10):
+        budget.deposit()
+    assert [budget.withdraw() for _ in range(3)] == [True, True, False]
+
+
+def test_backoff_is_full_jitter_up_to_the_cap():
+    retry = _retry(base_delay=0.1, max_delay=1.0)
+    for attempt, cap in ((1, 0.1), (2, 0.2), (3, 0.4), (4, 0.8), (5, 1.0), (10, 1.0)):
+        delays = [retry.backoff(attempt) for _ in range(200)]
+        assert all(0 <= delay <= cap for delay in delays)
+        # Spread over the range, not pinned to the cap
+        assert min(delays) < cap / 2 < max(delays)
+
+
+def test_retries_retryable_statuses_until_success():
+    retry = _retry()
+    send, calls = _responses(502, 503, 200)
+    response = asyncio.run(retry.run("get", send))
+    assert response.status_code == 200
+    assert len(calls) == 3
+    assert retry.retries == 2
+
+
+def test_gives_up_after_attempts():
+    retry = _retry()
+    send, calls = _responses(502)
+    assert asyncio.run(retry.run("get", send)).status_code == 502
+    assert len(calls) == 3
+
+
+def test_does_not_retry_other_statuses():
+    retry = _retry()
+    send, calls = _responses(404)
+    assert asyncio.run(retry.run("get", send)).status_code == 404
+    assert len(calls) == 1
+
+
+def test_reraises_transport_errors_after_attempts():
+    retry = _retry()
+    calls = []
+
+    async def send() -> httpx.Response:
+        calls.append(1)
+        raise httpx.ConnectError("refused")
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(retry.run("get", send))
+    assert len(calls) == 3
+
+
+def test_exhausted_budget_stops_retries():
+    retry = _retry(budget=RetryBudget(ratio=0.0, burst=1))
+    send, calls = _responses(502)
+    asyncio.run(retry.run("get", send))
+    assert len(calls) == 2
+
+    send, calls = _responses(502)
+    asyncio.run(retry.run("get", send))
+    assert len(calls) == 1
+    assert retry.budget.exhausted >= 1
+
+
+def test_latency_quantile():
+    tracker = LatencyTracker(quantile=0.9)
+    for n in range(1, 101):
+        tracker.observe(n / 1000)
+    assert tracker.value(min_samples=200) is None
+    assert tracker.value(min_samples=10) == pytest.approx(0.091)
+
+
+def test_hedge_wins_and_slow_call_is_cancelled():
+    retry = _retry(hedging=True, hedge_min_samples=1)
+    # A fast call teaches the tracker a 10ms latency
+    retry._tracker("get").observe(0.01)
+
+    started = []
+    cancelled = []
+
+    async def send() -> httpx.Response:
+        number = len(started)
+        started.append(number)
+        try:
+            # The first call hangs, the hedge answers at once
+            await asyncio.sleep(5 if number == 0 else 0)
+        except asyncio.CancelledError:
+            cancelled.append(number)
+            raise
+        return httpx.Response(200, text=str(number))
+
+    async def run() -> httpx.Response:
+        response = await retry.run("get", send)
+        # Let the cancellation of the loser land
+        await asyncio.sleep(0)
+        return response
+
+    response = asyncio.run(run())
+    assert response.text == "1"
+    assert started == [0, 1]
+    assert cancelled == [0]
+    assert retry.hedges == 1
+    assert retry.hedge_wins == 1
+
+
+def test_no_hedge_without_budget():
+    retry = _retry(hedging=True, hedge_min_samples=1, budget=RetryBudget(ratio=0.0, burst=0))
+    retry._tracker("get").observe(0.001)
+    started = []
+
+    async def send() -> httpx.Response:
+        started.append(1)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200)
+
+    assert asyncio.run(retry.run("get", send)).status_code == 200
+    assert len(started) == 1
+    assert retry.hedges == 0